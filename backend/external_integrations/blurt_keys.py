@@ -0,0 +1,121 @@
+from beemgraphenebase.account import PrivateKey
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import argparse
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import time
+
+
+def derive_public_key(wif: str, prefix: str = "BLT") -> Optional[str]:
+    """Derive the public key for a WIF private key (CPU-bound secp256k1 work)"""
+    try:
+        return str(PrivateKey(wif, prefix=prefix).pubkey)
+    except Exception:
+        return None
+
+
+class DerivedKeyCache:
+    """Bounded LRU of derived public keys, keyed by a salted hash of the submitted key"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # Per-process salt; the submitted key itself is never stored
+        self.salt = os.urandom(32)
+        self.entries: OrderedDict = OrderedDict()
+
+    def key_for(self, wif: str) -> bytes:
+        return hmac.new(self.salt, wif.encode(), hashlib.sha256).digest()
+
+    def get(self, cache_key: bytes):
+        if cache_key not in self.entries:
+            return None, False
+        self.entries.move_to_end(cache_key)
+        return self.entries[cache_key], True
+
+    def put(self, cache_key: bytes, public_key: Optional[str]):
+        self.entries[cache_key] = public_key
+        self.entries.move_to_end(cache_key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class KeyDeriver:
+    """Runs WIF -> public key derivation in a dedicated, bounded process pool"""
+
+    def __init__(self, workers: int, cache_size: int = 10000, prefix: str = "BLT"):
+        self.workers = workers
+        self.prefix = prefix
+        self.cache = DerivedKeyCache(cache_size)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        # Bound queued work so a login spike cannot pile up unbounded pool tasks
+        self.slots = asyncio.Semaphore(workers * 4)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            # Spawned workers only import this module, not the server and its connections
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.pool
+
+    async def derive(self, wif: str) -> Optional[str]:
+        """Return the public key for a WIF, or None if it is not a valid key"""
+        cache_key = self.cache.key_for(wif)
+        public_key, found = self.cache.get(cache_key)
+        if found:
+            return public_key
+
+        loop = asyncio.get_event_loop()
+        async with self.slots:
+            public_key = await loop.run_in_executor(self._get_pool(), derive_public_key, wif, self.prefix)
+        self.cache.put(cache_key, public_key)
+        return public_key
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+async def run_benchmark(workers: int, count: int) -> dict:
+    """Measure key verifications per second in-process, through the pool and from the cache"""
+    wifs = [str(PrivateKey(prefix="BLT")) for _ in range(count)]
+
+    started = time.perf_counter()
+    for wif in wifs:
+        derive_public_key(wif)
+    single_rate = count / (time.perf_counter() - started)
+
+    deriver = KeyDeriver(workers, cache_size=count)
+    # Warm the pool so process start-up is not measured
+    await asyncio.gather(*[deriver.derive(str(PrivateKey(prefix="BLT"))) for _ in range(workers)])
+    started = time.perf_counter()
+    await asyncio.gather(*[deriver.derive(wif) for wif in wifs])
+    pool_rate = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[deriver.derive(wif) for wif in wifs])
+    cached_rate = count / (time.perf_counter() - started)
+    deriver.shutdown()
+
+    return {
+        "workers": workers,
+        "verifications": count,
+        "single_process_per_second": round(single_rate, 1),
+        "pool_per_second": round(pool_rate, 1),
+        "pool_per_second_per_core": round(pool_rate / workers, 1),
+        "cached_per_second": round(cached_rate, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark posting key derivation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+    print(asyncio.run(run_benchmark(args.workers, args.count)))
@@ -0,0 +1,76 @@
+from abc import ABC, abstractmethod
+from beem import Blurt
+from beem.account import Account
+from typing import Dict, List, Optional
+import asyncio
+import uuid
+
+
+class RewardBroadcaster(ABC):
+    """Sends reward transfers to players; the memo identifies the payout"""
+
+    @abstractmethod
+    async def transfer(self, username: str, amount: float, memo: str) -> str:
+        """Send `amount` BLURT to `username` and return the transaction id"""
+
+    @abstractmethod
+    async def find_transfer(self, memo: str) -> Optional[str]:
+        """Return the transaction id of an already-sent transfer with this memo"""
+
+
+class BeemBroadcaster(RewardBroadcaster):
+    """Broadcasts transfers from the payout account through beem"""
+
+    def __init__(self, account: str, active_key: str, history_depth: int = 1000):
+        self.account = account
+        self.blurt = Blurt(keys=[active_key])
+        self.history_depth = history_depth
+
+    async def transfer(self, username: str, amount: float, memo: str) -> str:
+        loop = asyncio.get_event_loop()
+
+        def send():
+            payer = Account(self.account, blockchain_instance=self.blurt)
+            result = payer.transfer(username, amount, "BLURT", memo=memo)
+            return result.get("trx_id", "")
+
+        return await loop.run_in_executor(None, send)
+
+    async def find_transfer(self, memo: str) -> Optional[str]:
+        loop = asyncio.get_event_loop()
+
+        def lookup():
+            payer = Account(self.account, blockchain_instance=self.blurt)
+            # Recent transfers only; a payout is retried soon after its lease expires
+            history = payer.history_reverse(only_ops=["transfer"], batch_size=100)
+            for checked, operation in enumerate(history):
+                if checked >= self.history_depth:
+                    break
+                if operation.get("memo") == memo and operation.get("from") == self.account:
+                    return operation.get("trx_id", "")
+            return None
+
+        return await loop.run_in_executor(None, lookup)
+
+
+class FakeChainBroadcaster(RewardBroadcaster):
+    """In-memory chain for tests and local development"""
+
+    def __init__(self, fail_usernames: Optional[List[str]] = None):
+        self.transfers: Dict[str, dict] = {}
+        self.broadcasts: List[dict] = []  # Every transfer sent, including duplicates
+        self.lookups: List[str] = []
+        self.fail_usernames = set(fail_usernames or [])
+
+    async def transfer(self, username: str, amount: float, memo: str) -> str:
+        if username in self.fail_usernames:
+            raise RuntimeError(f"Transfer to {username} rejected")
+        tx_id = uuid.uuid4().hex
+        self.transfers[memo] = {"tx_id": tx_id, "to": username, "amount": amount}
+        self.broadcasts.append({"tx_id": tx_id, "to": username, "amount": amount, "memo": memo})
+        return tx_id
+
+    async def find_transfer(self, memo: str) -> Optional[str]:
+        self.lookups.append(memo)
+        transfer = self.transfers.get(memo)
+        return transfer["tx_id"] if transfer else None
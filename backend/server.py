@@ -1,30 +1,131 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import json_util
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, Dict, List, Optional
 import uuid
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
+from cryptography.fernet import Fernet, InvalidToken
 from beem import Blurt
 from beem.account import Account
 from beem.exceptions import AccountDoesNotExistsException
+from external_integrations.blurt_keys import KeyDeriver
+from external_integrations.blurt_payouts import BeemBroadcaster, FakeChainBroadcaster, RewardBroadcaster
+from collections import OrderedDict
+import argparse
 import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
 import traceback
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+class PoolWaitMetrics(ConnectionPoolListener):
+    """Measures how long operations wait to check a connection out of the pool"""
+    
+    BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]  # seconds
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = {}
+        self.count = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+    
+    def _key(self, event):
+        # Checkouts run synchronously on the calling thread
+        return (threading.get_ident(), event.address)
+    
+    def _record(self, event, failed: bool):
+        with self.lock:
+            started = self.started.pop(self._key(event), None)
+            if started is None:
+                return
+            waited = time.perf_counter() - started
+            self.count += 1
+            self.failures += 1 if failed else 0
+            self.total_seconds += waited
+            self.max_seconds = max(self.max_seconds, waited)
+            bucket = next((i for i, edge in enumerate(self.BUCKETS) if waited <= edge), len(self.BUCKETS))
+            self.histogram[bucket] += 1
+    
+    def connection_check_out_started(self, event):
+        with self.lock:
+            self.started[self._key(event)] = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        self._record(event, failed=False)
+    
+    def connection_check_out_failed(self, event):
+        self._record(event, failed=True)
+    
+    def snapshot(self) -> dict:
+        with self.lock:
+            labels = [f"<={edge}" for edge in self.BUCKETS] + [f">{self.BUCKETS[-1]}"]
+            return {
+                "checkouts": self.count,
+                "failed_checkouts": self.failures,
+                "total_wait_seconds": self.total_seconds,
+                "average_wait_seconds": self.total_seconds / self.count if self.count else 0,
+                "max_wait_seconds": self.max_seconds,
+                "histogram": dict(zip(labels, self.histogram))
+            }
+    
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_wait_metrics = PoolWaitMetrics()
+mongo_options = {
+    "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+    # zstandard ships in requirements.txt and zlib is built in; add snappy only with python-snappy installed
+    "compressors": os.environ.get("MONGO_COMPRESSORS", "zstd,zlib"),
+    "event_listeners": [pool_wait_metrics],
+}
+if os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS"):
+    mongo_options["waitQueueTimeoutMS"] = int(os.environ["MONGO_WAIT_QUEUE_TIMEOUT_MS"])
+client = AsyncIOMotorClient(mongo_url, **mongo_options)
 db = client[os.environ['DB_NAME']]
 
+# Stale-tolerant reads (leaderboards, admin listings, stats) may go to secondaries
+if os.environ.get("MONGO_SECONDARY_READS", "false").lower() == "true":
+    # MongoDB requires maxStalenessSeconds of at least 90
+    max_staleness = max(int(os.environ.get("MONGO_MAX_STALENESS_SECONDS", "90")), 90)
+    stale_db = client.get_database(
+        os.environ['DB_NAME'], read_preference=SecondaryPreferred(max_staleness=max_staleness)
+    )
+else:
+    stale_db = db
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -38,8 +139,79 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Shared secret for admin routes that change game data; unset disables them (use the CLI)
+ADMIN_API_TOKEN = os.environ.get("ADMIN_API_TOKEN")
+
 # Blurt settings
-blurt_instance = Blurt()
+blurt_instance = None
+
+def get_blurt_instance() -> Blurt:
+    """Connect to Blurt on first use, so importing the app needs no network"""
+    global blurt_instance
+    if blurt_instance is None:
+        blurt_instance = Blurt()
+    return blurt_instance
+
+BLURT_KEY_PREFIX = os.environ.get("BLURT_KEY_PREFIX", "BLT")
+KEY_DERIVATION_WORKERS = int(os.environ.get("KEY_DERIVATION_WORKERS", str(min(os.cpu_count() or 1, 4))))
+key_deriver = KeyDeriver(
+    KEY_DERIVATION_WORKERS,
+    cache_size=int(os.environ.get("KEY_DERIVATION_CACHE_SIZE", "10000")),
+    prefix=BLURT_KEY_PREFIX
+)
+
+# Windowed leaderboard settings: bucket lifetime after the period ends
+LEADERBOARD_WINDOWS = {
+    "day": timedelta(days=7),
+    "week": timedelta(weeks=4),
+    "season": timedelta(days=90),
+}
+
+# Gameplay analytics histogram bucket edges
+TIME_HISTOGRAM_EDGES = [10, 30, 60, 120, 300]  # seconds
+SCORE_HISTOGRAM_WIDTH = 25  # points
+
+# level_completions history settings
+COMPLETIONS_RAW_RETENTION_DAYS = int(os.environ.get("COMPLETIONS_RAW_RETENTION_DAYS", "30"))
+COMPLETIONS_ROLLUP_LAG_DAYS = int(os.environ.get("COMPLETIONS_ROLLUP_LAG_DAYS", "2"))
+COMPLETIONS_ROLLUP_INTERVAL_SECONDS = int(os.environ.get("COMPLETIONS_ROLLUP_INTERVAL_SECONDS", "3600"))
+COMPLETIONS_ARCHIVE_DIR = os.environ.get("COMPLETIONS_ARCHIVE_DIR")  # Optional NDJSON archive
+
+# Quiz attempt settings
+QUESTIONS_PER_ATTEMPT = int(os.environ.get("QUESTIONS_PER_ATTEMPT", "3"))
+QUIZ_ATTEMPT_EXPIRE_MINUTES = int(os.environ.get("QUIZ_ATTEMPT_EXPIRE_MINUTES", "60"))
+OFFLINE_ATTEMPT_EXPIRE_HOURS = int(os.environ.get("OFFLINE_ATTEMPT_EXPIRE_HOURS", "72"))
+MAX_SYNC_BATCH_SIZE = 50
+OFFLINE_BUNDLE_LEVELS = int(os.environ.get("OFFLINE_BUNDLE_LEVELS", "3"))  # Upcoming levels issued for offline play
+# Fernet key for attempt tokens (AES-128-CBC + HMAC-SHA256), e.g. from Fernet.generate_key().
+# Required at startup; it also keys the answer digest, so it must never be committed.
+ATTEMPT_TOKEN_KEY = os.environ.get("ATTEMPT_TOKEN_KEY")
+attempt_token_cipher = Fernet(ATTEMPT_TOKEN_KEY) if ATTEMPT_TOKEN_KEY else None
+
+# Reward payout settings
+PAYOUT_ACCOUNT = os.environ.get("PAYOUT_ACCOUNT")
+PAYOUT_ACTIVE_KEY = os.environ.get("PAYOUT_ACTIVE_KEY")
+PAYOUT_FAKE_CHAIN = os.environ.get("PAYOUT_FAKE_CHAIN", "false").lower() == "true"
+PAYOUT_CHUNK_SIZE = int(os.environ.get("PAYOUT_CHUNK_SIZE", "500"))
+PAYOUT_LEASE_SECONDS = int(os.environ.get("PAYOUT_LEASE_SECONDS", "300"))
+
+# Question pack settings
+QUESTION_PACK_BATCH_SIZE = 1000
+QUESTION_PACK_POLL_SECONDS = int(os.environ.get("QUESTION_PACK_POLL_SECONDS", "30"))
+
+# Score reconciliation settings
+RECONCILE_CHUNK_SIZE = int(os.environ.get("RECONCILE_CHUNK_SIZE", "1000"))
+RECONCILE_WORKERS = int(os.environ.get("RECONCILE_WORKERS", "4"))
+RECONCILE_THROTTLE_SECONDS = float(os.environ.get("RECONCILE_THROTTLE_SECONDS", "0.1"))
+RECONCILE_QUIET_SECONDS = 300  # Skip users active this recently; their writes may be in flight
+
+# Idempotency settings
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_MONGO_STORE = os.environ.get("IDEMPOTENCY_STORE", "memory").lower() == "mongo"
+IDEMPOTENCY_WAIT_SECONDS = 30  # How long a duplicate waits for the original request
+IDEMPOTENCY_LEASE_SECONDS = 30  # How long an in-flight key is held before a retry may take it over
+IDEMPOTENCY_RETRYABLE_STATUSES = {408, 409, 425, 429}  # Transient client errors that are never replayed
 
 # Define Models
 class BlurtAuthRequest(BaseModel):
@@ -55,7 +227,8 @@ class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     username: str
     current_level: int = 1
-    completed_levels: List[int] = []
+    completed_mask: int = 0  # Bit (level - 1) is set once the level is completed
+    levels_completed: int = 0
     total_score: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_active: datetime = Field(default_factory=datetime.utcnow)
@@ -68,6 +241,21 @@ class QuizQuestion(BaseModel):
     correct_answer: int  # Index of correct option
     points: int
     category: str  # "general", "technology", "crypto", "blurt"
+    content_hash: Optional[str] = None
+
+class LevelSubmission(BaseModel):
+    attempt_token: str
+    answers: List[int]
+    time_taken: Optional[int] = None  # Ignored, timing is measured from the attempt token
+
+class LevelSyncItem(BaseModel):
+    level: int
+    attempt_token: str
+    answers: List[int]
+    time_taken: Optional[int] = None  # Client timing, capped by the token's age
+
+class LevelSyncRequest(BaseModel):
+    results: List[LevelSyncItem]
 
 class LevelCompletion(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -77,6 +265,8 @@ class LevelCompletion(BaseModel):
     completed_at: datetime = Field(default_factory=datetime.utcnow)
     questions_answered: int
     time_taken_seconds: int
+    passed: bool = False
+    points_awarded: int = 0  # Points added to total_score (first completion only)
 
 class RewardClaim(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -84,30 +274,302 @@ class RewardClaim(BaseModel):
     level: int
     reward_amount: float  # Blurt tokens
     claimed_at: datetime = Field(default_factory=datetime.utcnow)
-    status: str = "pending"  # pending, processed
+    status: str = "pending"  # pending, processing, processed
+
+class QuestionBank:
+    """In-memory index of question IDs and answer keys per level"""
+    
+    def __init__(self):
+        self.answer_keys: Dict[str, dict] = {}
+        self.level_ids: Dict[int, List[str]] = {}
+        self.version = 0
+    
+    async def load(self):
+        """Rebuild the index from the quiz_questions collection"""
+        version = await current_question_pack_version()
+        answer_keys = {}
+        level_ids = {}
+        cursor = db.quiz_questions.aggregate([
+            {"$project": {
+                "_id": 0,
+                "id": 1,
+                "level": 1,
+                "correct_answer": 1,
+                "points": 1,
+                "option_count": {"$size": "$options"}
+            }}
+        ], batchSize=5000)
+        async for question in cursor:
+            answer_keys[question["id"]] = question
+            level_ids.setdefault(question["level"], []).append(question["id"])
+        
+        # Swap in one step so concurrent requests see either bank, never a mix
+        self.answer_keys, self.level_ids, self.version = answer_keys, level_ids, version
+        logging.info(f"Loaded {len(answer_keys)} quiz questions (pack version {version}) into the question bank")
+    
+    def sample(self, level: int, size: int) -> List[str]:
+        """Pick a random subset of question IDs for one attempt"""
+        ids = self.level_ids.get(level, [])
+        return random.sample(ids, min(size, len(ids)))
+    
+    def get(self, question_id: str) -> Optional[dict]:
+        return self.answer_keys.get(question_id)
+    
+    def digest(self, question_ids: List[str]) -> Optional[str]:
+        """Digest of the answer keys for a question subset, None if any question is gone"""
+        # Keyed with the server secret so the digest cannot be brute-forced for answers
+        hasher = hmac.new(ATTEMPT_TOKEN_KEY.encode(), digestmod=hashlib.sha256)
+        for question_id in question_ids:
+            question = self.answer_keys.get(question_id)
+            if question is None:
+                return None
+            hasher.update(f"{question_id}:{question['correct_answer']}:{question['points']};".encode())
+        return hasher.hexdigest()
+
+question_bank = QuestionBank()
+
+async def question_bank_refresh_loop():
+    """Reload the question bank when another worker imports a new pack"""
+    while True:
+        await asyncio.sleep(QUESTION_PACK_POLL_SECONDS)
+        try:
+            if await current_question_pack_version() != question_bank.version:
+                await question_bank.load()
+        except Exception as e:
+            logging.error(f"Question bank refresh failed: {str(e)}")
+
+class IdempotencyCache:
+    """Bounded in-memory LRU of completed responses plus in-flight originals"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Future] = {}
+    
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+    
+    def put(self, key: str, fingerprint: str, outcome: dict):
+        self.entries[key] = {
+            "fingerprint": fingerprint,
+            "outcome": outcome,
+            "expires": time.monotonic() + self.ttl_seconds
+        }
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
 
 # Helper Functions
+def level_bit(level: int) -> int:
+    """Bit for a level in users.completed_mask"""
+    return 1 << (level - 1)
+
+def levels_from_mask(mask: int) -> List[int]:
+    """Expand a completed_mask into the sorted list of completed levels"""
+    return [level for level in range(1, mask.bit_length() + 1) if mask & level_bit(level)]
+
+def mask_from_levels(levels: List[int]) -> int:
+    """Build a completed_mask from a legacy completed_levels array"""
+    mask = 0
+    for level in levels:
+        mask |= level_bit(level)
+    return mask
+
+def user_completed_mask(user: dict) -> int:
+    """Read a user's completed levels as a bitmask, falling back to the legacy array"""
+    if "completed_mask" in user:
+        return user["completed_mask"]
+    return mask_from_levels(user.get("completed_levels", []))
+
+def user_levels_completed(user: dict) -> int:
+    """Read a user's completed level count, falling back to the legacy array"""
+    if "levels_completed" in user:
+        return user["levels_completed"]
+    return len(user.get("completed_levels", []))
+
+async def migrate_user_completed_levels(user: dict) -> dict:
+    """Convert a legacy user document to the bitmask representation in place"""
+    if "completed_mask" in user:
+        return user
+    mask = user_completed_mask(user)
+    await db.users.update_one(
+        {"_id": user["_id"], "completed_mask": {"$exists": False}},
+        {
+            "$set": {"completed_mask": mask, "levels_completed": bin(mask).count("1")},
+            "$unset": {"completed_levels": ""}
+        }
+    )
+    # Re-read so a concurrent migration or submit is reflected
+    return await db.users.find_one({"_id": user["_id"]})
+
+async def record_first_completions(username: str, bits: int, levels: int, points: int, current_level: int) -> bool:
+    """Mark levels completed and credit them in one update; False if any of them was already completed"""
+    update = {"$set": {"last_active": datetime.utcnow()}}
+    if bits:
+        update["$bit"] = {"completed_mask": {"or": bits}}
+        update["$inc"] = {"levels_completed": levels, "total_score": points}
+        update["$max"] = {"current_level": current_level}
+    # The bitsAllClear filter makes the first completion win atomically
+    result = await db.users.update_one(
+        {"username": username, "completed_mask": {"$bitsAllClear": bits}},
+        update
+    )
+    return result.matched_count == 1
+
+async def backfill_completed_masks(batch_size: int = 500, pause_seconds: float = 0.05) -> int:
+    """Online backfill of completed_mask/levels_completed for legacy user documents"""
+    # Runs once per deployment; the walk along _id is skipped after it has completed
+    state = await acquire_job_lease("completed_mask_backfill", 3600)
+    if state is None or state.get("completed_at"):
+        if state is not None:
+            await release_job_lease("completed_mask_backfill")
+        return 0
+    
+    migrated = 0
+    last_id = state.get("last_id")
+    while True:
+        query = {"completed_mask": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        users = await db.users.find(
+            query, {"_id": 1, "completed_levels": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        
+        operations = []
+        for user in users:
+            mask = mask_from_levels(user.get("completed_levels", []))
+            operations.append(UpdateOne(
+                {"_id": user["_id"], "completed_mask": {"$exists": False}},
+                {
+                    "$set": {"completed_mask": mask, "levels_completed": bin(mask).count("1")},
+                    "$unset": {"completed_levels": ""}
+                }
+            ))
+        result = await db.users.bulk_write(operations, ordered=False)
+        migrated += result.modified_count
+        last_id = users[-1]["_id"]
+        await db.job_state.update_one(
+            {"_id": "completed_mask_backfill"},
+            {"$set": {"last_id": last_id, "lease_until": datetime.utcnow() + timedelta(seconds=3600)}}
+        )
+        
+        # Yield to gameplay traffic between batches
+        await asyncio.sleep(pause_seconds)
+    
+    await release_job_lease("completed_mask_backfill", {"completed_at": datetime.utcnow()})
+    if migrated:
+        logging.info(f"Backfilled completed_mask for {migrated} users")
+    return migrated
+
 async def verify_blurt_posting_key(username: str, posting_key: str) -> bool:
     """Verify Blurt posting key for the given username"""
     try:
         loop = asyncio.get_event_loop()
         
-        def check_key():
+        def get_posting_keys():
             try:
-                account = Account(username, blockchain_instance=blurt_instance)
-                # Check if the posting key is valid for this account
-                return account.posting_keys[0] == posting_key or posting_key in account.posting_keys
+                account = Account(username, blockchain_instance=get_blurt_instance())
+                return [key for key, weight in account["posting"]["key_auths"]]
             except AccountDoesNotExistsException:
-                return False
-            except Exception as e:
-                logging.error(f"Error verifying key: {str(e)}")
-                return False
+                return []
         
-        result = await loop.run_in_executor(None, check_key)
-        return result
+        # Derive the public key off the event loop while the account is fetched
+        public_key, posting_keys = await asyncio.gather(
+            key_deriver.derive(posting_key),
+            loop.run_in_executor(None, get_posting_keys)
+        )
+        return public_key is not None and public_key in posting_keys
     except Exception as e:
+        # A node outage is not a wrong key; report it as retryable instead of a 401
         logging.error(f"Error in verify_blurt_posting_key: {str(e)}")
-        return False
+        raise HTTPException(status_code=503, detail="Blurt node unavailable, please retry")
+
+def create_attempt_token(username: str, level: int, question_ids: List[str]) -> str:
+    """Issue an encrypted, signed token describing one quiz attempt"""
+    payload = {
+        "u": username,
+        "l": level,
+        "q": question_ids,
+        "d": question_bank.digest(question_ids),
+        "t": time.time(),
+        "n": uuid.uuid4().hex  # Nonce that makes the token single-use
+    }
+    return attempt_token_cipher.encrypt(json.dumps(payload).encode()).decode()
+
+def read_attempt_token(
+    token: str,
+    username: str,
+    level: int,
+    ttl_seconds: int = QUIZ_ATTEMPT_EXPIRE_MINUTES * 60
+) -> dict:
+    """Verify and decrypt an attempt token issued to this user for this level"""
+    try:
+        payload = json.loads(attempt_token_cipher.decrypt(token.encode(), ttl=ttl_seconds))
+    except (InvalidToken, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid or expired attempt token")
+    if payload["u"] != username or payload["l"] != level:
+        raise HTTPException(status_code=400, detail="Attempt token does not match this level")
+    return payload
+
+async def consume_attempt_tokens(attempts: List[dict]) -> set:
+    """Mark attempt tokens as used; returns the indexes of tokens that were already used"""
+    if not attempts:
+        return set()
+    # Remember nonces for as long as any token can still be valid
+    lifetime = timedelta(seconds=max(QUIZ_ATTEMPT_EXPIRE_MINUTES * 60, OFFLINE_ATTEMPT_EXPIRE_HOURS * 3600))
+    try:
+        await db.used_attempt_tokens.insert_many(
+            [{"_id": a["n"], "expires_at": datetime.utcfromtimestamp(a["t"]) + lifetime} for a in attempts],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        return {error["index"] for error in e.details["writeErrors"] if error["code"] == 11000}
+    return set()
+
+async def release_attempt_tokens(attempts: List[dict]):
+    """Make attempt tokens usable again after their submit was not applied"""
+    if attempts:
+        await db.used_attempt_tokens.delete_many({"_id": {"$in": [a["n"] for a in attempts]}})
+
+def score_answers(attempt: dict, answers: List[int]) -> dict:
+    """Score answers against the questions issued in an attempt token"""
+    # Get correct answers for the issued questions from the in-memory bank
+    if question_bank.digest(attempt["q"]) != attempt["d"]:
+        raise HTTPException(status_code=409, detail="Level questions changed, please restart the level")
+    questions = [question_bank.get(question_id) for question_id in attempt["q"]]
+    if len(answers) != len(questions):
+        raise HTTPException(status_code=400, detail="Invalid number of answers")
+    
+    # Calculate score
+    correct_answers = 0
+    total_points = 0
+    
+    for i, question in enumerate(questions):
+        if answers[i] == question["correct_answer"]:
+            correct_answers += 1
+            total_points += question["points"]
+    
+    # Level completion threshold (need at least 60% correct)
+    passing_score = len(questions) * 0.6
+    return {
+        "questions": questions,
+        "correct_answers": correct_answers,
+        "total_points": total_points,
+        "passing_score": passing_score,
+        "level_completed": correct_answers >= passing_score
+    }
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -136,6 +598,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
         raise credentials_exception
     return username
 
+async def require_admin(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Allow a request only if it carries the configured admin token"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_API_TOKEN or use the admin CLI")
+    if not admin_token or not hmac.compare_digest(admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 # Initialize quiz questions
 async def init_quiz_questions():
     """Initialize quiz questions if not exists"""
@@ -193,15 +662,899 @@ async def init_quiz_questions():
             {"level": 10, "question": "What is the ultimate goal of blockchain technology?", "options": ["Make money", "Decentralization and trustlessness", "Replace banks", "Create cryptocurrencies"], "correct_answer": 1, "points": 100, "category": "crypto"},
         ]
         
-        for q in questions:
-            question_obj = QuizQuestion(**q)
-            await db.quiz_questions.insert_one(question_obj.dict())
+        await db.quiz_questions.insert_many([
+            QuizQuestion(**q, content_hash=question_content_hash(q)).dict() for q in questions
+        ])
         
         logging.info(f"Initialized {len(questions)} quiz questions")
 
+def leaderboard_period(window: str, when: datetime) -> tuple:
+    """Return (period key, period end) of the leaderboard window containing `when`"""
+    day_start = datetime(when.year, when.month, when.day)
+    if window == "day":
+        return day_start.strftime("%Y-%m-%d"), day_start + timedelta(days=1)
+    if window == "week":
+        iso_year, iso_week, iso_weekday = when.isocalendar()
+        week_start = day_start - timedelta(days=iso_weekday - 1)
+        return f"{iso_year}-W{iso_week:02d}", week_start + timedelta(weeks=1)
+    if window == "season":
+        # Seasons are calendar quarters
+        quarter = (when.month - 1) // 3
+        if quarter == 3:
+            season_end = datetime(when.year + 1, 1, 1)
+        else:
+            season_end = datetime(when.year, quarter * 3 + 4, 1)
+        return f"{when.year}-Q{quarter + 1}", season_end
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+async def record_leaderboard_score(username: str, points: int, levels: int = 1):
+    """Increment the user's day/week/season leaderboard buckets for passing submits"""
+    await db.leaderboard_buckets.bulk_write(
+        leaderboard_operations(username, points, levels), ordered=False
+    )
+
+def leaderboard_operations(username: str, points: int, levels: int) -> List[UpdateOne]:
+    """Build the bucket increments for the user's current day/week/season"""
+    now = datetime.utcnow()
+    operations = []
+    for window, retention in LEADERBOARD_WINDOWS.items():
+        period, period_end = leaderboard_period(window, now)
+        operations.append(UpdateOne(
+            {"_id": f"{window}:{period}:{username}"},
+            {
+                "$inc": {"score": points, "levels_passed": levels},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "window": window,
+                    "period": period,
+                    "username": username,
+                    "expires_at": period_end + retention
+                }
+            },
+            upsert=True
+        ))
+    return operations
+
+def time_histogram_bucket(seconds: int) -> str:
+    """Fixed histogram bucket label for a time taken"""
+    lower = 0
+    for edge in TIME_HISTOGRAM_EDGES:
+        if seconds < edge:
+            return f"{lower}-{edge}"
+        lower = edge
+    return f"{lower}+"
+
+def score_histogram_bucket(score: int) -> str:
+    """Fixed histogram bucket label for a level score"""
+    lower = (score // SCORE_HISTOGRAM_WIDTH) * SCORE_HISTOGRAM_WIDTH
+    return f"{lower}-{lower + SCORE_HISTOGRAM_WIDTH}"
+
+def option_count_key(question: dict, answer: int) -> str:
+    """Histogram key for an answer; unanswered or out-of-range answers share one bucket"""
+    if 0 <= answer < question["option_count"]:
+        return str(answer)
+    return "none"
+
+def level_stats_operations(
+    level: int,
+    questions: List[dict],
+    answers: List[int],
+    correct_answers: int,
+    score: int,
+    time_taken: int,
+    passed: bool
+) -> tuple:
+    """Build the level_stats update and question_stats updates for one attempt"""
+    level_operation = UpdateOne(
+        {"_id": level},
+        {"$inc": {
+            "attempts": 1,
+            "passes": 1 if passed else 0,
+            "score_total": score,
+            "time_total_seconds": time_taken,
+            "questions_answered": len(answers),
+            "correct_answers": correct_answers,
+            f"correct_histogram.{correct_answers}": 1,
+            f"score_histogram.{score_histogram_bucket(score)}": 1,
+            f"time_histogram.{time_histogram_bucket(time_taken)}": 1
+        }},
+        upsert=True
+    )
+    
+    question_operations = []
+    for question, answer in zip(questions, answers):
+        question_operations.append(UpdateOne(
+            {"_id": question["id"]},
+            {
+                "$inc": {
+                    "answered": 1,
+                    "correct": 1 if answer == question["correct_answer"] else 0,
+                    f"option_counts.{option_count_key(question, answer)}": 1
+                },
+                "$setOnInsert": {"level": level}
+            },
+            upsert=True
+        ))
+    return level_operation, question_operations
+
+async def record_level_stats(
+    level_operations: List[UpdateOne],
+    question_operations: List[UpdateOne]
+):
+    """Update pre-aggregated per-level and per-question gameplay counters"""
+    if level_operations:
+        await db.level_stats.bulk_write(level_operations, ordered=False)
+    if question_operations:
+        await db.question_stats.bulk_write(question_operations, ordered=False)
+
+async def init_indexes():
+    """Create indexes used by gameplay and leaderboard queries"""
+    await db.users.create_index("username")
+    await db.users.create_index([("total_score", DESCENDING)])
+    await db.users.create_index([("levels_completed", DESCENDING), ("total_score", DESCENDING)])
+    await db.quiz_questions.create_index([("level", ASCENDING)])
+    await db.quiz_questions.create_index("id", unique=True)
+    await db.leaderboard_buckets.create_index(
+        [("window", ASCENDING), ("period", ASCENDING), ("score", DESCENDING)]
+    )
+    await db.leaderboard_buckets.create_index("expires_at", expireAfterSeconds=0)
+    await db.question_stats.create_index([("level", ASCENDING)])
+    await db.reward_claims.create_index([("status", ASCENDING), ("lease_expires", ASCENDING)])
+    await db.reward_claims.create_index("lease_id")
+    await db.reward_claims.create_index("payout_id")
+    await db.level_completions.create_index([("username", ASCENDING), ("completed_at", ASCENDING)])
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    await db.used_attempt_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.completion_daily.create_index([("username", ASCENDING), ("day", ASCENDING)])
+    
+    # Raw completions only get an expires_at once their day is rolled up (and archived)
+    await db.level_completions.create_index("completed_at")
+    await db.level_completions.create_index("expires_at", expireAfterSeconds=0)
+    try:
+        # Superseded TTL on completed_at, which could delete rows before they were rolled up
+        await db.level_completions.drop_index("completed_at_ttl")
+    except OperationFailure:
+        pass
+
+# Question Packs
+def question_content_hash(question: dict) -> str:
+    """Hash of the fields that define a question's content"""
+    content = {key: question[key] for key in ("level", "question", "options", "correct_answer", "points", "category")}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+async def current_question_pack_version() -> int:
+    """Latest imported question pack version, 0 for the built-in seed"""
+    latest = await db.question_pack_versions.find_one({}, sort=[("_id", -1)])
+    return latest["_id"] if latest else 0
+
+def question_pack_error(question: QuizQuestion) -> Optional[str]:
+    """Check a pack question against the game's rules, returning the first problem found"""
+    if not 1 <= question.level <= 10:
+        return "level must be between 1 and 10"
+    if not question.question.strip():
+        return "question must not be empty"
+    if len(question.options) < 2 or not all(option.strip() for option in question.options):
+        return "options must contain at least two non-empty choices"
+    if not 0 <= question.correct_answer < len(question.options):
+        return "correct_answer is not a valid option index"
+    if question.points <= 0:
+        return "points must be positive"
+    return None
+
+async def allocate_question_pack_version() -> int:
+    """Atomically allocate the next question pack version"""
+    # Start the counter from any versions recorded before it existed
+    await db.job_state.update_one(
+        {"_id": "question_pack_version"},
+        {"$max": {"value": await current_question_pack_version()}},
+        upsert=True
+    )
+    counter = await db.job_state.find_one_and_update(
+        {"_id": "question_pack_version"},
+        {"$inc": {"value": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"]
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+async def import_question_pack(lines: AsyncIterator[str], prune: bool = False) -> dict:
+    """Validate a JSONL question pack and apply new or changed questions in batches"""
+    existing = {}
+    async for question in db.quiz_questions.find({}, {"_id": 0, "id": 1, "content_hash": 1}).batch_size(5000):
+        existing[question["id"]] = question.get("content_hash")
+    
+    # Validate the whole pack before writing anything
+    operations = []
+    errors = []
+    pack_ids = set()
+    unchanged = 0
+    added = 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            content_hash = question_content_hash(data)
+            data.setdefault("id", content_hash)
+            question = QuizQuestion(**{**data, "content_hash": content_hash})
+        except (ValueError, KeyError, TypeError, ValidationError) as e:
+            errors.append({"line": line_number, "error": str(e)})
+            continue
+        error = question_pack_error(question)
+        if error:
+            errors.append({"line": line_number, "error": error})
+            continue
+        if question.id in pack_ids:
+            errors.append({"line": line_number, "error": f"Duplicate question id {question.id}"})
+            continue
+        
+        pack_ids.add(question.id)
+        if existing.get(question.id) == content_hash:
+            unchanged += 1
+            continue
+        if question.id not in existing:
+            added += 1
+        operations.append(ReplaceOne({"id": question.id}, question.dict(), upsert=True))
+    
+    if errors:
+        return {"applied": False, "errors": errors[:100], "error_count": len(errors)}
+    
+    for start in range(0, len(operations), QUESTION_PACK_BATCH_SIZE):
+        await db.quiz_questions.bulk_write(operations[start:start + QUESTION_PACK_BATCH_SIZE], ordered=False)
+    
+    removed = 0
+    if prune:
+        stale_ids = [question_id for question_id in existing if question_id not in pack_ids]
+        for start in range(0, len(stale_ids), QUESTION_PACK_BATCH_SIZE):
+            result = await db.quiz_questions.delete_many(
+                {"id": {"$in": stale_ids[start:start + QUESTION_PACK_BATCH_SIZE]}}
+            )
+            removed += result.deleted_count
+    
+    summary = {
+        "applied": True,
+        "version": question_bank.version,
+        "added": added,
+        "changed": len(operations) - added,
+        "unchanged": unchanged,
+        "removed": removed
+    }
+    if operations or removed:
+        # Bump the pack version; other workers pick it up on their next poll
+        version = await allocate_question_pack_version()
+        await db.question_pack_versions.insert_one({
+            "_id": version,
+            "imported_at": datetime.utcnow(),
+            **{key: summary[key] for key in ("added", "changed", "removed")}
+        })
+        await question_bank.load()
+        summary["version"] = version
+    
+    logging.info(f"Imported question pack: {summary}")
+    return summary
+
+async def export_question_pack(level: Optional[int] = None) -> AsyncIterator[str]:
+    """Stream questions as JSONL"""
+    query = {} if level is None else {"level": level}
+    cursor = db.quiz_questions.find(query, {"_id": 0, "content_hash": 0}).sort([("level", 1), ("id", 1)])
+    async for question in cursor.batch_size(1000):
+        yield json.dumps(question) + "\n"
+
+# Idempotency
+def request_fingerprint(body: BaseModel) -> str:
+    """Hash of a request body, so a reused key with a different request is rejected"""
+    return hashlib.sha256(json.dumps(jsonable_encoder(body), sort_keys=True).encode()).hexdigest()
+
+def replay_outcome(entry: dict, fingerprint: str):
+    """Return a stored response, or re-raise a stored client error"""
+    if entry["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request")
+    outcome = entry["outcome"]
+    if "error" in outcome:
+        raise HTTPException(status_code=outcome["error"]["status_code"], detail=outcome["error"]["detail"])
+    return outcome["response"]
+
+async def claim_stored_key(key: str, fingerprint: str, owner: str) -> bool:
+    """Take the Mongo key for this request; False if another live worker holds it"""
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": key,
+            "status": "in_flight",
+            "fingerprint": fingerprint,
+            "owner": owner,
+            "lease_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+    # A worker that crashed mid-request leaves its lease to expire; take it over
+    taken = await db.idempotency_keys.find_one_and_update(
+        {"_id": key, "status": "in_flight", "fingerprint": fingerprint, "lease_until": {"$lt": now}},
+        {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+    )
+    return taken is not None
+
+async def renew_stored_key(key: str, owner: str):
+    """Keep an in-flight key's lease alive while its handler runs; stops once the key is lost"""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+        result = await db.idempotency_keys.update_one(
+            {"_id": key, "status": "in_flight", "owner": owner},
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+        )
+        if result.matched_count == 0:
+            return
+
+async def wait_for_stored_outcome(key: str, fingerprint: str, owner: str):
+    """Wait for another worker's in-flight original to finish and replay its outcome.
+    Returns None once the key is claimed here and the handler should run."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        stored = await db.idempotency_keys.find_one({"_id": key})
+        if stored is not None and stored["fingerprint"] != fingerprint:
+            # Raises 422: the key belongs to a different request
+            return replay_outcome(stored, fingerprint)
+        if stored is not None and stored["status"] == "completed":
+            idempotency_cache.put(key, stored["fingerprint"], stored["outcome"])
+            return replay_outcome(stored, fingerprint)
+        if stored is None or stored["lease_until"] < datetime.utcnow():
+            # The original failed or its worker died; run it here if the key can be claimed
+            if await claim_stored_key(key, fingerprint, owner):
+                return None
+        await asyncio.sleep(0.1)
+    raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+async def run_idempotent(key: Optional[str], scope: str, fingerprint: str, handler, persist: bool = True):
+    """Run a mutating handler once per Idempotency-Key and replay its outcome to duplicates.
+    With persist=False the outcome is only kept in this worker's memory, never in Mongo."""
+    if not key:
+        return await handler()
+    cache_key = f"{scope}:{key}"
+    
+    entry = idempotency_cache.get(cache_key)
+    if entry is not None:
+        return replay_outcome(entry, fingerprint)
+    
+    # A concurrent duplicate in this worker waits on the original
+    in_flight = idempotency_cache.in_flight.get(cache_key)
+    if in_flight is not None:
+        await asyncio.shield(in_flight)
+        entry = idempotency_cache.get(cache_key)
+        if entry is None:
+            raise HTTPException(status_code=409, detail="The original request with this Idempotency-Key failed, please retry")
+        return replay_outcome(entry, fingerprint)
+    
+    use_store = IDEMPOTENCY_MONGO_STORE and persist
+    owner = uuid.uuid4().hex
+    if use_store and not await claim_stored_key(cache_key, fingerprint, owner):
+        # The wait hands the key over if the original worker died
+        replay = await wait_for_stored_outcome(cache_key, fingerprint, owner)
+        if replay is not None:
+            return replay
+    
+    future = asyncio.get_event_loop().create_future()
+    idempotency_cache.in_flight[cache_key] = future
+    renewal = asyncio.create_task(renew_stored_key(cache_key, owner)) if use_store else None
+    try:
+        try:
+            response = await handler()
+            outcome = {"response": jsonable_encoder(response)}
+        except HTTPException as e:
+            if e.status_code >= 500 or e.status_code in IDEMPOTENCY_RETRYABLE_STATUSES:
+                raise
+            # Other client errors are deterministic, so they are replayed too
+            outcome = {"error": {"status_code": e.status_code, "detail": e.detail}}
+        
+        idempotency_cache.put(cache_key, fingerprint, outcome)
+        if use_store:
+            # Only the current owner records the outcome; a worker that lost its lease leaves the key alone
+            await db.idempotency_keys.update_one(
+                {"_id": cache_key, "owner": owner},
+                {"$set": {"status": "completed", "outcome": outcome}, "$unset": {"owner": "", "lease_until": ""}}
+            )
+        return replay_outcome({"fingerprint": fingerprint, "outcome": outcome}, fingerprint)
+    except BaseException:
+        # Nothing to replay; free the key so a retry runs again
+        if use_store:
+            await db.idempotency_keys.delete_one({"_id": cache_key, "status": "in_flight", "owner": owner})
+        raise
+    finally:
+        if renewal is not None:
+            renewal.cancel()
+        del idempotency_cache.in_flight[cache_key]
+        future.set_result(None)
+
+# Background Jobs
+async def acquire_job_lease(name: str, lease_seconds: int) -> Optional[dict]:
+    """Take the lease on a job's state document, or return None if another worker holds it"""
+    now = datetime.utcnow()
+    try:
+        return await db.job_state.find_one_and_update(
+            {"_id": name, "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=lease_seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists and its lease is still held
+        return None
+
+async def release_job_lease(name: str, updates: Optional[dict] = None):
+    """Release a job's lease, optionally saving its checkpoint"""
+    # Unset rather than stamp "now": BSON dates keep milliseconds, so an immediate
+    # re-acquire would still see lease_until == now and fail the $lt match
+    update = {"$unset": {"lease_until": ""}}
+    if updates:
+        update["$set"] = updates
+    await db.job_state.update_one({"_id": name}, update)
+
+async def archive_completions_day(day: datetime, batch_size: int = 1000) -> int:
+    """Stream one day of raw completions to gzip-compressed NDJSON before TTL deletes them"""
+    loop = asyncio.get_event_loop()
+    archive_dir = Path(COMPLETIONS_ARCHIVE_DIR)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    target = archive_dir / f"level_completions-{day.strftime('%Y-%m-%d')}.ndjson.gz"
+    partial = target.with_name(target.name + ".partial")
+    
+    cursor = db.level_completions.find(
+        {"completed_at": {"$gte": day, "$lt": day + timedelta(days=1)}}
+    ).sort("completed_at", 1).batch_size(batch_size)
+    
+    archived = 0
+    lines = []
+    archive = gzip.open(partial, "wt", encoding="utf-8")
+    try:
+        async for document in cursor:
+            lines.append(json_util.dumps(document) + "\n")
+            if len(lines) >= batch_size:
+                # Compression is CPU-bound, keep it off the event loop
+                await loop.run_in_executor(None, archive.writelines, lines)
+                archived += len(lines)
+                lines = []
+        if lines:
+            await loop.run_in_executor(None, archive.writelines, lines)
+            archived += len(lines)
+    finally:
+        archive.close()
+    
+    # Only publish complete files
+    partial.replace(target)
+    return archived
+
+async def rollup_completions_day(day: datetime):
+    """Compact one day of raw completions into per-user summary documents"""
+    day_key = day.strftime("%Y-%m-%d")
+    pipeline = [
+        {"$match": {"completed_at": {"$gte": day, "$lt": day + timedelta(days=1)}}},
+        {"$group": {
+            "_id": "$username",
+            "attempts": {"$sum": 1},
+            "passes": {"$sum": {"$cond": [{"$ifNull": ["$passed", False]}, 1, 0]}},
+            "score_total": {"$sum": "$score"},
+            "points_awarded": {"$sum": {"$ifNull": ["$points_awarded", 0]}},
+            "legacy_attempts": {"$sum": {"$cond": [{"$eq": [{"$type": "$points_awarded"}, "missing"]}, 1, 0]}},
+            "time_total_seconds": {"$sum": "$time_taken_seconds"},
+            "levels_played": {"$addToSet": "$level"}
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id", ":", day_key]},
+            "username": "$_id",
+            "day": day,
+            "attempts": 1,
+            "passes": 1,
+            "score_total": 1,
+            "points_awarded": 1,
+            "legacy_attempts": 1,
+            "time_total_seconds": 1,
+            "levels_played": 1
+        }},
+        # Whole days are re-summarised, so replacing keeps reruns idempotent
+        {"$merge": {"into": "completion_daily", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    await db.level_completions.aggregate(pipeline).to_list(None)
+
+async def expire_completions_day(day: datetime):
+    """Schedule a rolled-up day of raw completions for TTL deletion after the retention period"""
+    retention = timedelta(days=max(COMPLETIONS_RAW_RETENTION_DAYS, COMPLETIONS_ROLLUP_LAG_DAYS + 1))
+    await db.level_completions.update_many(
+        {"completed_at": {"$gte": day, "$lt": day + timedelta(days=1)}},
+        {"$set": {"expires_at": day + timedelta(days=1) + retention}}
+    )
+
+async def run_completion_rollup() -> int:
+    """Roll up (and optionally archive) every closed day not yet rolled up"""
+    state = await acquire_job_lease("completion_rollup", COMPLETIONS_ROLLUP_INTERVAL_SECONDS)
+    if state is None:
+        return 0
+    
+    days_processed = 0
+    rolled_through = state.get("rolled_through")
+    try:
+        if rolled_through is None:
+            oldest = await db.level_completions.find_one({}, sort=[("completed_at", 1)])
+            if oldest is None:
+                return 0
+            completed_at = oldest["completed_at"]
+            rolled_through = datetime(completed_at.year, completed_at.month, completed_at.day)
+        
+        now = datetime.utcnow()
+        cutoff = datetime(now.year, now.month, now.day) - timedelta(days=COMPLETIONS_ROLLUP_LAG_DAYS)
+        while rolled_through < cutoff:
+            await rollup_completions_day(rolled_through)
+            if COMPLETIONS_ARCHIVE_DIR:
+                await archive_completions_day(rolled_through)
+            await expire_completions_day(rolled_through)
+            rolled_through += timedelta(days=1)
+            days_processed += 1
+            # Checkpoint after each day so an interrupted run resumes here
+            await db.job_state.update_one(
+                {"_id": "completion_rollup"}, {"$set": {"rolled_through": rolled_through}}
+            )
+    finally:
+        await release_job_lease("completion_rollup")
+    
+    if days_processed:
+        logging.info(f"Rolled up {days_processed} days of level completions")
+    return days_processed
+
+async def completion_rollup_loop():
+    """Periodically run the level_completions roll-up"""
+    while True:
+        try:
+            await run_completion_rollup()
+        except Exception as e:
+            logging.error(f"Completion roll-up failed: {str(e)}")
+        await asyncio.sleep(COMPLETIONS_ROLLUP_INTERVAL_SECONDS)
+
+# Score Reconciliation
+async def next_user_chunk(after_id, chunk_size: int) -> Optional[tuple]:
+    """Return the (exclusive lower, inclusive upper) _id bounds of the next chunk of users"""
+    query = {} if after_id is None else {"_id": {"$gt": after_id}}
+    first = await db.users.find_one(query, {"_id": 1}, sort=[("_id", 1)])
+    if first is None:
+        return None
+    upper = await db.users.find(query, {"_id": 1}).sort("_id", 1).skip(chunk_size - 1).limit(1).to_list(1)
+    # A short final chunk is open-ended
+    return after_id, upper[0]["_id"] if upper else None
+
+async def reconcile_user_chunk(bounds: tuple, rolled_through: Optional[datetime], dry_run: bool) -> List[dict]:
+    """Recompute scores for one _id range of users and correct any drift"""
+    lower, upper = bounds
+    id_range = {}
+    if lower is not None:
+        id_range["$gt"] = lower
+    if upper is not None:
+        id_range["$lte"] = upper
+    users = await db.users.find(
+        {"_id": id_range} if id_range else {},
+        {"username": 1, "total_score": 1, "completed_mask": 1, "levels_completed": 1, "last_active": 1}
+    ).to_list(None)
+    usernames = [user["username"] for user in users]
+    
+    # Points awarded come from raw rows not yet rolled up plus daily summaries of rolled-up days
+    raw_match = {"username": {"$in": usernames}}
+    if rolled_through is not None:
+        raw_match["completed_at"] = {"$gte": rolled_through}
+    totals = {}
+    raw_pipeline = [
+        {"$match": raw_match},
+        {"$group": {
+            "_id": "$username",
+            "points": {"$sum": {"$ifNull": ["$points_awarded", 0]}},
+            "legacy": {"$sum": {"$cond": [{"$eq": [{"$type": "$points_awarded"}, "missing"]}, 1, 0]}}
+        }}
+    ]
+    async for row in db.level_completions.aggregate(raw_pipeline):
+        totals[row["_id"]] = row
+    if rolled_through is not None:
+        daily_pipeline = [
+            {"$match": {"username": {"$in": usernames}, "day": {"$lt": rolled_through}}},
+            {"$group": {
+                "_id": "$username",
+                "points": {"$sum": "$points_awarded"},
+                "legacy": {"$sum": "$legacy_attempts"}
+            }}
+        ]
+        async for row in db.completion_daily.aggregate(daily_pipeline):
+            total = totals.setdefault(row["_id"], {"points": 0, "legacy": 0})
+            total["points"] += row["points"]
+            total["legacy"] += row["legacy"]
+    
+    quiet_before = datetime.utcnow() - timedelta(seconds=RECONCILE_QUIET_SECONDS)
+    diffs = []
+    operations = []
+    for user in users:
+        if "completed_mask" not in user or user.get("last_active", quiet_before) > quiet_before:
+            continue
+        total = totals.get(user["username"], {"points": 0, "legacy": 0})
+        corrections = {}
+        
+        expected_levels = bin(user["completed_mask"]).count("1")
+        if user.get("levels_completed") != expected_levels:
+            corrections["levels_completed"] = expected_levels
+        # Completions recorded before points_awarded existed cannot be attributed
+        if total["legacy"] == 0 and user.get("total_score") != total["points"]:
+            corrections["total_score"] = total["points"]
+        if not corrections:
+            continue
+        
+        diffs.append({
+            "username": user["username"],
+            "before": {key: user.get(key) for key in corrections},
+            "after": corrections
+        })
+        # Only apply if the user has not changed since it was read
+        operations.append(UpdateOne(
+            {
+                "_id": user["_id"],
+                "total_score": user.get("total_score"),
+                "levels_completed": user.get("levels_completed"),
+                "last_active": {"$lte": quiet_before}
+            },
+            {"$set": corrections}
+        ))
+    
+    if operations and not dry_run:
+        await db.users.bulk_write(operations, ordered=False)
+    return diffs
+
+async def run_score_reconciliation(
+    dry_run: bool = True,
+    resume: bool = True,
+    chunk_size: int = RECONCILE_CHUNK_SIZE,
+    workers: int = RECONCILE_WORKERS,
+    max_chunks: Optional[int] = None
+) -> dict:
+    """Walk users in _id chunks, processed in parallel waves, and correct score drift"""
+    lease_seconds = 600
+    state = await acquire_job_lease("score_reconcile", lease_seconds)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Score reconciliation is already running")
+    
+    rollup_state = await db.job_state.find_one({"_id": "completion_rollup"}) or {}
+    rolled_through = rollup_state.get("rolled_through")
+    after_id = state.get("last_id") if resume and not dry_run else None
+    
+    summary = {"dry_run": dry_run, "chunks": 0, "corrections": 0, "diffs": []}
+    try:
+        finished = False
+        while not finished and (max_chunks is None or summary["chunks"] < max_chunks):
+            # Plan the next wave of chunks, then reconcile them concurrently
+            wave = []
+            while len(wave) < workers and (max_chunks is None or summary["chunks"] + len(wave) < max_chunks):
+                bounds = await next_user_chunk(after_id, chunk_size)
+                if bounds is None or bounds[1] is None:
+                    finished = True
+                    if bounds is not None:
+                        wave.append(bounds)
+                    break
+                wave.append(bounds)
+                after_id = bounds[1]
+            if not wave:
+                break
+            
+            results = await asyncio.gather(*[
+                reconcile_user_chunk(bounds, rolled_through, dry_run) for bounds in wave
+            ])
+            summary["chunks"] += len(wave)
+            for diffs in results:
+                summary["corrections"] += len(diffs)
+                summary["diffs"].extend(diffs[:1000 - len(summary["diffs"])])
+            
+            if not dry_run:
+                # Checkpoint the last fully reconciled _id and keep the lease alive
+                await db.job_state.update_one(
+                    {"_id": "score_reconcile"},
+                    {"$set": {
+                        "last_id": None if finished else after_id,
+                        "lease_until": datetime.utcnow() + timedelta(seconds=lease_seconds)
+                    }}
+                )
+            await asyncio.sleep(RECONCILE_THROTTLE_SECONDS)
+    finally:
+        await release_job_lease("score_reconcile")
+    
+    logging.info(f"Score reconciliation: {summary['chunks']} chunks, {summary['corrections']} corrections (dry_run={dry_run})")
+    return summary
+
+# Reward Payouts
+fake_chain = FakeChainBroadcaster()
+
+def get_payout_broadcaster() -> Optional[RewardBroadcaster]:
+    """Build the configured payout broadcaster, if any"""
+    if PAYOUT_FAKE_CHAIN:
+        return fake_chain
+    if PAYOUT_ACCOUNT and PAYOUT_ACTIVE_KEY:
+        return BeemBroadcaster(PAYOUT_ACCOUNT, PAYOUT_ACTIVE_KEY)
+    return None
+
+async def claim_reward_chunk(lease_id: str, chunk_size: int) -> List[dict]:
+    """Move a chunk of pending (or lease-expired) claims to processing under a new lease"""
+    now = datetime.utcnow()
+    claimable = {"$or": [
+        {"status": "pending"},
+        {"status": "processing", "lease_expires": {"$lt": now}}
+    ]}
+    candidates = await db.reward_claims.find(claimable, {"_id": 1}).limit(chunk_size).to_list(chunk_size)
+    if not candidates:
+        return []
+    
+    # The filter is re-checked per document, so concurrent runners never share a claim
+    await db.reward_claims.update_many(
+        {"_id": {"$in": [c["_id"] for c in candidates]}, **claimable},
+        {"$set": {
+            "status": "processing",
+            "lease_id": lease_id,
+            "lease_expires": now + timedelta(seconds=PAYOUT_LEASE_SECONDS)
+        }}
+    )
+    return await db.reward_claims.find({"lease_id": lease_id}).to_list(None)
+
+async def assign_payouts(claims: List[dict], lease_id: str) -> List[str]:
+    """Group claims into one payout per user; claims from an interrupted run keep their payout"""
+    payout_ids = {c["payout_id"] for c in claims if c.get("payout_id")}
+    
+    by_username = {}
+    for claim in claims:
+        if not claim.get("payout_id"):
+            by_username.setdefault(claim["username"], []).append(claim)
+    
+    payouts = []
+    claim_operations = []
+    for username, user_claims in by_username.items():
+        payout_id = str(uuid.uuid4())
+        claim_ids = [c["_id"] for c in user_claims]
+        payouts.append({
+            "_id": payout_id,
+            "username": username,
+            "amount": round(sum(c["reward_amount"] for c in user_claims), 3),
+            "claim_count": len(claim_ids),
+            "status": "pending",
+            "created_at": datetime.utcnow()
+        })
+        claim_operations.append(UpdateMany(
+            {"_id": {"$in": claim_ids}, "lease_id": lease_id, "payout_id": {"$exists": False}},
+            {"$set": {"payout_id": payout_id}}
+        ))
+        payout_ids.add(payout_id)
+    
+    # Record the payout before its claims point at it, so a crash never leaves a dangling payout_id
+    if payouts:
+        await db.reward_payouts.bulk_write([InsertOne(p) for p in payouts], ordered=False)
+        await db.reward_claims.bulk_write(claim_operations, ordered=False)
+    return list(payout_ids)
+
+async def send_payout(payout_id: str, broadcaster: RewardBroadcaster, runner_id: str) -> Optional[str]:
+    """Send one payout at most once, using its id as the transfer memo; None if another runner owns it"""
+    now = datetime.utcnow()
+    # Take the payout atomically before broadcasting; a "sending" payout is only taken over once its owner is gone
+    before = await db.reward_payouts.find_one_and_update(
+        {"_id": payout_id, "$or": [
+            {"status": "pending"},
+            {"status": "sending", "owner_expires": {"$lt": now}}
+        ]},
+        {"$set": {
+            "status": "sending",
+            "owner": runner_id,
+            "owner_expires": now + timedelta(seconds=PAYOUT_LEASE_SECONDS)
+        }},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        current = await db.reward_payouts.find_one({"_id": payout_id})
+        return current["tx_id"] if current and current["status"] == "sent" else None
+    
+    tx_id = None
+    if before["status"] == "sending":
+        # The previous owner may have broadcast before it failed
+        tx_id = await broadcaster.find_transfer(payout_id)
+    try:
+        if tx_id is None:
+            tx_id = await broadcaster.transfer(before["username"], before["amount"], payout_id)
+    except Exception:
+        # The outcome is unknown, so stay "sending"; the next owner checks the chain first
+        await db.reward_payouts.update_one(
+            {"_id": payout_id, "owner": runner_id},
+            {"$set": {"owner_expires": datetime.utcnow()}}
+        )
+        raise
+    
+    await db.reward_payouts.update_one(
+        {"_id": payout_id, "owner": runner_id},
+        {
+            "$set": {"status": "sent", "tx_id": tx_id, "sent_at": datetime.utcnow()},
+            "$unset": {"owner": "", "owner_expires": ""}
+        }
+    )
+    return tx_id
+
+async def renew_payout_leases(lease_id: str):
+    """Extend the run lease and the current chunk's claim leases"""
+    lease_until = datetime.utcnow() + timedelta(seconds=PAYOUT_LEASE_SECONDS)
+    await db.job_state.update_one({"_id": "reward_payouts"}, {"$set": {"lease_until": lease_until}})
+    await db.reward_claims.update_many(
+        {"lease_id": lease_id, "status": "processing"},
+        {"$set": {"lease_expires": lease_until}}
+    )
+
+async def run_reward_payouts(
+    broadcaster: RewardBroadcaster,
+    chunk_size: int = PAYOUT_CHUNK_SIZE,
+    max_chunks: Optional[int] = None
+) -> dict:
+    """Pay out pending reward claims in chunks, one transfer per user per chunk"""
+    state = await acquire_job_lease("reward_payouts", PAYOUT_LEASE_SECONDS)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Reward payouts are already running")
+    
+    runner_id = str(uuid.uuid4())
+    summary = {"claims_processed": 0, "payouts_sent": 0, "amount_sent": 0.0, "payouts_failed": 0}
+    chunks = 0
+    try:
+        while max_chunks is None or chunks < max_chunks:
+            lease_id = str(uuid.uuid4())
+            claims = await claim_reward_chunk(lease_id, chunk_size)
+            if not claims:
+                break
+            chunks += 1
+            
+            payout_ids = await assign_payouts(claims, lease_id)
+            payouts = await db.reward_payouts.find({"_id": {"$in": payout_ids}}).to_list(None)
+            
+            claim_operations = []
+            renewed_at = time.monotonic()
+            for payout in payouts:
+                if time.monotonic() - renewed_at > PAYOUT_LEASE_SECONDS / 3:
+                    await renew_payout_leases(lease_id)
+                    renewed_at = time.monotonic()
+                try:
+                    tx_id = await send_payout(payout["_id"], broadcaster, runner_id)
+                except Exception as e:
+                    # Claims stay in processing and are retried with the same payout once the lease expires
+                    logging.error(f"Payout {payout['_id']} to {payout['username']} failed: {str(e)}")
+                    summary["payouts_failed"] += 1
+                    continue
+                if tx_id is None:
+                    # Owned by another runner; its claims are finished there
+                    continue
+                
+                claim_operations.append(UpdateMany(
+                    {"payout_id": payout["_id"], "status": "processing"},
+                    {
+                        "$set": {"status": "processed", "tx_id": tx_id, "processed_at": datetime.utcnow()},
+                        "$unset": {"lease_id": "", "lease_expires": ""}
+                    }
+                ))
+                summary["payouts_sent"] += 1
+                summary["amount_sent"] += payout["amount"]
+            
+            if claim_operations:
+                result = await db.reward_claims.bulk_write(claim_operations, ordered=False)
+                summary["claims_processed"] += result.modified_count
+    finally:
+        await release_job_lease("reward_payouts")
+    
+    summary["amount_sent"] = round(summary["amount_sent"], 3)
+    if summary["payouts_sent"]:
+        logging.info(f"Reward payouts: {summary}")
+    return summary
+
 # Authentication Routes
-@api_router.post("/auth/login", response_model=AuthResponse)
-async def login(auth_request: BlurtAuthRequest):
+async def authenticate(auth_request: BlurtAuthRequest):
     """Authenticate user with Blurt posting key"""
     try:
         # Demo mode for testing - check if username starts with "demo_"
@@ -252,6 +1605,21 @@ async def login(auth_request: BlurtAuthRequest):
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Authentication failed")
 
+@api_router.post("/auth/login", response_model=AuthResponse)
+async def login(
+    auth_request: BlurtAuthRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Authenticate user with Blurt posting key"""
+    return await run_idempotent(
+        idempotency_key,
+        f"login:{auth_request.username}",
+        request_fingerprint(auth_request),
+        lambda: authenticate(auth_request),
+        # Login responses carry a live access token; keep them out of the database
+        persist=False
+    )
+
 # Game Routes
 @api_router.get("/user/profile")
 async def get_user_profile(current_user: str = Depends(get_current_user)):
@@ -263,9 +1631,9 @@ async def get_user_profile(current_user: str = Depends(get_current_user)):
     return {
         "username": user["username"],
         "current_level": user["current_level"],
-        "completed_levels": user["completed_levels"],
+        "completed_levels": levels_from_mask(user_completed_mask(user)),
         "total_score": user["total_score"],
-        "levels_completed": len(user["completed_levels"]),
+        "levels_completed": user_levels_completed(user),
         "next_level": user["current_level"] if user["current_level"] <= 10 else None
     }
 
@@ -283,55 +1651,75 @@ async def get_level_questions(level: int, current_user: str = Depends(get_curren
     if level > user["current_level"]:
         raise HTTPException(status_code=403, detail="Level not unlocked yet")
     
-    # Get questions for this level
-    questions = await db.quiz_questions.find({"level": level}).to_list(100)
+    return await issue_level_attempt(level, current_user)
+
+@api_router.get("/game/offline-bundle")
+async def get_offline_bundle(levels: int = OFFLINE_BUNDLE_LEVELS, current_user: str = Depends(get_current_user)):
+    """Issue attempts for the current level and the ones after it, to be played offline and synced later"""
+    user = await db.users.find_one({"username": current_user})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    # Remove correct answers from response
-    for q in questions:
-        q.pop("correct_answer", None)
+    # Upcoming levels still have to be passed in order: sync rejects a level the batch has not unlocked
+    first_level = user["current_level"]
+    last_level = min(10, first_level + max(1, min(levels, OFFLINE_BUNDLE_LEVELS)) - 1)
+    attempts = await asyncio.gather(*[
+        issue_level_attempt(level, current_user) for level in range(first_level, last_level + 1)
+    ])
+    return {"current_level": first_level, "levels": attempts}
+
+async def issue_level_attempt(level: int, username: str) -> dict:
+    """Sample a level's questions and issue the attempt token they are scored against"""
+    # Sample this attempt's questions from the in-memory index and fetch only those
+    question_ids = question_bank.sample(level, QUESTIONS_PER_ATTEMPT)
+    documents = await db.quiz_questions.find(
+        {"id": {"$in": question_ids}}, {"_id": 0, "correct_answer": 0}
+    ).to_list(len(question_ids))
+    by_id = {q["id"]: q for q in documents}
+    questions = [by_id[question_id] for question_id in question_ids if question_id in by_id]
+    
+    # The token carries the issued subset so the submit is scored against exactly these questions
+    attempt_token = create_attempt_token(username, level, [q["id"] for q in questions])
     
     return {
         "level": level,
+        "attempt_token": attempt_token,
         "questions": questions,
         "total_questions": len(questions)
     }
 
-@api_router.post("/game/level/{level}/submit")
-async def submit_level(
-    level: int, 
-    answers: List[int], 
-    time_taken: int,
-    current_user: str = Depends(get_current_user)
-):
-    """Submit answers for a level"""
+async def apply_level_submission(level: int, submission: LevelSubmission, current_user: str):
+    """Score a level submission and record the user's progress"""
     if level < 1 or level > 10:
         raise HTTPException(status_code=400, detail="Invalid level")
+    answers = submission.answers
+    attempt = read_attempt_token(submission.attempt_token, current_user, level)
+    time_taken = int(time.time() - attempt["t"])
     
     # Get user and verify access
     user = await db.users.find_one({"username": current_user})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user = await migrate_user_completed_levels(user)
     
     if level > user["current_level"]:
         raise HTTPException(status_code=403, detail="Level not unlocked yet")
     
-    # Get correct answers
-    questions = await db.quiz_questions.find({"level": level}).to_list(100)
-    if len(answers) != len(questions):
-        raise HTTPException(status_code=400, detail="Invalid number of answers")
+    scored = score_answers(attempt, answers)
+    if await consume_attempt_tokens([attempt]):
+        raise HTTPException(status_code=409, detail="This attempt was already submitted")
+    questions = scored["questions"]
+    correct_answers = scored["correct_answers"]
+    total_points = scored["total_points"]
+    passing_score = scored["passing_score"]
+    level_completed = scored["level_completed"]
     
-    # Calculate score
-    correct_answers = 0
-    total_points = 0
-    
-    for i, question in enumerate(questions):
-        if i < len(answers) and answers[i] == question["correct_answer"]:
-            correct_answers += 1
-            total_points += question["points"]
-    
-    # Level completion threshold (need at least 60% correct)
-    passing_score = len(questions) * 0.6
-    level_completed = correct_answers >= passing_score
+    # Update user progress if level completed and not already completed
+    first_completion = False
+    if level_completed and not user_completed_mask(user) & level_bit(level):
+        first_completion = await record_first_completions(
+            current_user, level_bit(level), 1, total_points, min(level + 1, 10)
+        )
     
     # Save level completion
     completion = LevelCompletion(
@@ -339,34 +1727,28 @@ async def submit_level(
         level=level,
         score=total_points,
         questions_answered=len(answers),
-        time_taken_seconds=time_taken
+        time_taken_seconds=time_taken,
+        passed=level_completed,
+        points_awarded=total_points if first_completion else 0
     )
     await db.level_completions.insert_one(completion.dict())
+    level_operation, question_operations = level_stats_operations(
+        level, questions, answers, correct_answers, total_points, time_taken, level_completed
+    )
+    await record_level_stats([level_operation], question_operations)
     
-    # Update user progress if level completed and not already completed
-    if level_completed and level not in user["completed_levels"]:
-        updated_completed = user["completed_levels"] + [level]
-        new_current_level = min(level + 1, 10) if level == user["current_level"] else user["current_level"]
-        new_total_score = user["total_score"] + total_points
-        
-        await db.users.update_one(
-            {"username": current_user},
-            {"$set": {
-                "completed_levels": updated_completed,
-                "current_level": new_current_level,
-                "total_score": new_total_score,
-                "last_active": datetime.utcnow()
-            }}
-        )
-        
+    reward_amount = level * 1.0  # 1 BLURT per level, increasing
+    if first_completion:
         # Create reward claim
-        reward_amount = level * 1.0  # 1 BLURT per level, increasing
         reward = RewardClaim(
             username=current_user,
             level=level,
             reward_amount=reward_amount
         )
         await db.reward_claims.insert_one(reward.dict())
+    if level_completed:
+        # Windowed boards count every passing submit, including replays of completed levels
+        await record_leaderboard_score(current_user, total_points)
     
     return {
         "level": level,
@@ -376,13 +1758,173 @@ async def submit_level(
         "level_completed": level_completed,
         "passing_score_needed": passing_score,
         "next_level_unlocked": level_completed and level < 10,
-        "reward_earned": level * 1.0 if level_completed and level not in user["completed_levels"] else 0
+        "reward_earned": reward_amount if first_completion else 0
+    }
+
+@api_router.post("/game/level/{level}/submit")
+async def submit_level(
+    level: int,
+    submission: LevelSubmission,
+    current_user: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Submit answers for a level"""
+    return await run_idempotent(
+        idempotency_key,
+        f"submit:{current_user}:{level}",
+        request_fingerprint(submission),
+        lambda: apply_level_submission(level, submission, current_user)
+    )
+
+async def apply_level_sync(sync_request: LevelSyncRequest, current_user: str):
+    """Score a batch of offline level results and apply them in bulk"""
+    if len(sync_request.results) > MAX_SYNC_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYNC_BATCH_SIZE} results per sync")
+    
+    user = await db.users.find_one({"username": current_user})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user = await migrate_user_completed_levels(user)
+    
+    # Replay the batch against the user's progress in memory
+    mask = user_completed_mask(user)
+    current_level = user["current_level"]
+    new_bits = 0
+    points_gained = 0
+    levels_gained = 0
+    window_points = 0
+    window_levels = 0
+    now = time.time()
+    
+    completions = []
+    rewards = []
+    level_operations = []
+    question_operations = []
+    
+    # Decode every token first so the batch's tokens are consumed in one write
+    attempts = [None] * len(sync_request.results)
+    results = [None] * len(sync_request.results)
+    for i, item in enumerate(sync_request.results):
+        try:
+            if item.level < 1 or item.level > 10:
+                raise HTTPException(status_code=400, detail="Invalid level")
+            attempts[i] = read_attempt_token(
+                item.attempt_token, current_user, item.level, OFFLINE_ATTEMPT_EXPIRE_HOURS * 3600
+            )
+        except HTTPException as e:
+            results[i] = {"level": item.level, "accepted": False, "detail": e.detail}
+    
+    decoded = [i for i, attempt in enumerate(attempts) if attempt is not None]
+    for position in await consume_attempt_tokens([attempts[i] for i in decoded]):
+        i = decoded[position]
+        attempts[i] = None
+        results[i] = {"level": sync_request.results[i].level, "accepted": False, "detail": "This attempt was already submitted"}
+    
+    unapplied = []
+    for i, item in enumerate(sync_request.results):
+        attempt = attempts[i]
+        if attempt is None:
+            continue
+        try:
+            if item.level > current_level:
+                raise HTTPException(status_code=403, detail="Level not unlocked yet")
+            scored = score_answers(attempt, item.answers)
+        except HTTPException as e:
+            results[i] = {"level": item.level, "accepted": False, "detail": e.detail}
+            unapplied.append(attempt)
+            attempts[i] = None
+            continue
+        
+        elapsed = int(now - attempt["t"])
+        time_taken = max(0, min(item.time_taken, elapsed)) if item.time_taken is not None else elapsed
+        first_completion = scored["level_completed"] and not mask & level_bit(item.level)
+        if scored["level_completed"]:
+            window_points += scored["total_points"]
+            window_levels += 1
+        if first_completion:
+            mask |= level_bit(item.level)
+            new_bits |= level_bit(item.level)
+            points_gained += scored["total_points"]
+            levels_gained += 1
+            current_level = max(current_level, min(item.level + 1, 10))
+            rewards.append(RewardClaim(
+                username=current_user,
+                level=item.level,
+                reward_amount=item.level * 1.0
+            ).dict())
+        
+        completions.append(LevelCompletion(
+            username=current_user,
+            level=item.level,
+            score=scored["total_points"],
+            questions_answered=len(item.answers),
+            time_taken_seconds=time_taken,
+            passed=scored["level_completed"],
+            points_awarded=scored["total_points"] if first_completion else 0
+        ).dict())
+        level_operation, operations = level_stats_operations(
+            item.level, scored["questions"], item.answers, scored["correct_answers"],
+            scored["total_points"], time_taken, scored["level_completed"]
+        )
+        level_operations.append(level_operation)
+        question_operations.extend(operations)
+        
+        results[i] = {
+            "level": item.level,
+            "accepted": True,
+            "correct_answers": scored["correct_answers"],
+            "total_questions": len(scored["questions"]),
+            "score": scored["total_points"],
+            "level_completed": scored["level_completed"],
+            "reward_earned": item.level * 1.0 if first_completion else 0
+        }
+    
+    # Rejected items may be resubmitted with the same token
+    await release_attempt_tokens(unapplied)
+    
+    # Apply progress first; this fails if a concurrent submit completed one of
+    # these levels, and the client can simply retry the sync
+    if not await record_first_completions(current_user, new_bits, levels_gained, points_gained, current_level):
+        await release_attempt_tokens([attempt for attempt in attempts if attempt is not None])
+        raise HTTPException(status_code=409, detail="Progress changed during sync, please retry")
+    
+    # One bulk write per collection
+    if completions:
+        await db.level_completions.bulk_write([InsertOne(c) for c in completions], ordered=False)
+    if rewards:
+        await db.reward_claims.bulk_write([InsertOne(r) for r in rewards], ordered=False)
+    if window_levels:
+        await record_leaderboard_score(current_user, window_points, window_levels)
+    await record_level_stats(level_operations, question_operations)
+    
+    return {
+        "results": results,
+        "current_level": current_level,
+        "score_gained": points_gained,
+        "rewards_earned": sum(r["reward_amount"] for r in rewards)
     }
 
+@api_router.post("/game/sync")
+async def sync_levels(
+    sync_request: LevelSyncRequest,
+    current_user: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Submit an ordered batch of level results played offline"""
+    return await run_idempotent(
+        idempotency_key,
+        f"sync:{current_user}",
+        request_fingerprint(sync_request),
+        lambda: apply_level_sync(sync_request, current_user)
+    )
+
 @api_router.get("/game/leaderboard")
 async def get_leaderboard():
     """Get top players leaderboard"""
-    users = await db.users.find().sort("total_score", -1).limit(20).to_list(20)
+    users = await stale_db.users.find(
+        {},
+        {"username": 1, "total_score": 1, "levels_completed": 1, "completed_levels": 1, "current_level": 1}
+    ).sort("total_score", -1).limit(20).to_list(20)
     
     leaderboard = []
     for i, user in enumerate(users):
@@ -390,25 +1932,150 @@ async def get_leaderboard():
             "rank": i + 1,
             "username": user["username"],
             "total_score": user["total_score"],
-            "levels_completed": len(user["completed_levels"]),
+            "levels_completed": user_levels_completed(user),
             "current_level": user["current_level"]
         })
     
     return {"leaderboard": leaderboard}
 
+@api_router.get("/game/leaderboard/{window}")
+async def get_windowed_leaderboard(window: str, period: Optional[str] = None):
+    """Get top players for a day, week or season, scored from every passing submit in the period"""
+    if window not in LEADERBOARD_WINDOWS:
+        raise HTTPException(status_code=400, detail="Invalid leaderboard window")
+    if period is None:
+        period, _ = leaderboard_period(window, datetime.utcnow())
+    
+    buckets = await stale_db.leaderboard_buckets.find(
+        {"window": window, "period": period},
+        {"username": 1, "score": 1, "levels_passed": 1}
+    ).sort("score", -1).limit(20).to_list(20)
+    
+    leaderboard = []
+    for i, bucket in enumerate(buckets):
+        leaderboard.append({
+            "rank": i + 1,
+            "username": bucket["username"],
+            "score": bucket["score"],
+            "levels_passed": bucket["levels_passed"]
+        })
+    
+    return {"window": window, "period": period, "leaderboard": leaderboard}
+
+@api_router.get("/game/leaderboard/{window}/rank")
+async def get_windowed_rank(
+    window: str,
+    period: Optional[str] = None,
+    current_user: str = Depends(get_current_user)
+):
+    """Get the current user's rank for a day, week or season"""
+    if window not in LEADERBOARD_WINDOWS:
+        raise HTTPException(status_code=400, detail="Invalid leaderboard window")
+    if period is None:
+        period, _ = leaderboard_period(window, datetime.utcnow())
+    
+    bucket = await stale_db.leaderboard_buckets.find_one({"_id": f"{window}:{period}:{current_user}"})
+    if not bucket:
+        return {"window": window, "period": period, "username": current_user, "rank": None, "score": 0}
+    
+    # Counted from the (window, period, score) index
+    ahead = await stale_db.leaderboard_buckets.count_documents(
+        {"window": window, "period": period, "score": {"$gt": bucket["score"]}}
+    )
+    return {
+        "window": window,
+        "period": period,
+        "username": current_user,
+        "rank": ahead + 1,
+        "score": bucket["score"]
+    }
+
 # Admin Routes
 @api_router.get("/admin/users")
 async def get_all_users():
     """Get all users for admin (simplified endpoint)"""
-    users = await db.users.find().sort("total_score", -1).to_list(1000)
+    users = await stale_db.users.find().sort("total_score", -1).to_list(1000)
     return {"users": users}
 
+@api_router.get("/admin/stats")
+async def get_gameplay_stats(level: Optional[int] = None):
+    """Get per-level gameplay analytics from the pre-aggregated counters"""
+    query = {} if level is None else {"_id": level}
+    level_docs = await stale_db.level_stats.find(query).sort("_id", 1).to_list(100)
+    
+    levels = []
+    for doc in level_docs:
+        attempts = doc.get("attempts", 0)
+        questions_answered = doc.get("questions_answered", 0)
+        levels.append({
+            "level": doc["_id"],
+            "attempts": attempts,
+            "passes": doc.get("passes", 0),
+            "pass_rate": doc.get("passes", 0) / attempts if attempts else 0,
+            "average_score": doc.get("score_total", 0) / attempts if attempts else 0,
+            "average_time_seconds": doc.get("time_total_seconds", 0) / attempts if attempts else 0,
+            "correct_rate": doc.get("correct_answers", 0) / questions_answered if questions_answered else 0,
+            "correct_histogram": doc.get("correct_histogram", {}),
+            "score_histogram": doc.get("score_histogram", {}),
+            "time_histogram": doc.get("time_histogram", {})
+        })
+    
+    response = {"levels": levels}
+    
+    # Per-question breakdown is only served for a single level
+    if level is not None:
+        question_docs = await stale_db.question_stats.find({"level": level}).to_list(None)
+        response["questions"] = [
+            {
+                "question_id": doc["_id"],
+                "answered": doc.get("answered", 0),
+                "correct": doc.get("correct", 0),
+                "correct_rate": doc.get("correct", 0) / doc["answered"] if doc.get("answered") else 0,
+                "option_counts": doc.get("option_counts", {})
+            }
+            for doc in question_docs
+        ]
+    
+    return response
+
+@api_router.post("/admin/jobs/rollup")
+async def trigger_completion_rollup():
+    """Run the level_completions roll-up now"""
+    days_processed = await run_completion_rollup()
+    return {"days_processed": days_processed}
+
+@api_router.post("/admin/questions/import", dependencies=[Depends(require_admin)])
+async def import_questions(request: Request, prune: bool = False):
+    """Import a JSONL question pack streamed in the request body"""
+    summary = await import_question_pack(iter_lines(request.stream()), prune=prune)
+    if not summary["applied"]:
+        raise HTTPException(status_code=400, detail=summary)
+    return summary
+
+@api_router.get("/admin/questions/export")
+async def export_questions(level: Optional[int] = None):
+    """Export questions as a JSONL question pack"""
+    return StreamingResponse(export_question_pack(level), media_type="application/x-ndjson")
+
 @api_router.get("/admin/rewards")
 async def get_reward_claims():
     """Get all reward claims for admin"""
-    rewards = await db.reward_claims.find().sort("claimed_at", -1).to_list(1000)
+    rewards = await stale_db.reward_claims.find().sort("claimed_at", -1).to_list(1000)
     return {"rewards": rewards}
 
+@api_router.post("/admin/jobs/reconcile", dependencies=[Depends(require_admin)])
+async def trigger_score_reconciliation(dry_run: bool = True, resume: bool = True, max_chunks: Optional[int] = None):
+    """Recompute user scores from completion history, optionally applying corrections"""
+    return await run_score_reconciliation(dry_run=dry_run, resume=resume, max_chunks=max_chunks)
+
+@api_router.post("/admin/payouts/run", dependencies=[Depends(require_admin)])
+async def trigger_reward_payouts(max_chunks: Optional[int] = None):
+    """Pay out pending reward claims through the configured broadcaster"""
+    broadcaster = get_payout_broadcaster()
+    if broadcaster is None:
+        raise HTTPException(status_code=503, detail="Reward payouts are not configured")
+    return await run_reward_payouts(broadcaster, max_chunks=max_chunks)
+
 @api_router.get("/admin/export/rewards")
 async def export_rewards():
     """Export rewards in CSV format for manual distribution"""
@@ -433,6 +2100,11 @@ async def export_rewards():
         "total_claims": len(csv_data)
     }
 
+@api_router.get("/admin/metrics")
+async def get_metrics():
+    """Get database connection pool metrics"""
+    return {"mongo_pool_wait": pool_wait_metrics.snapshot()}
+
 # Basic routes
 @api_router.get("/")
 async def root():
@@ -463,9 +2135,72 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     """Initialize data on startup"""
+    if attempt_token_cipher is None:
+        raise RuntimeError("ATTEMPT_TOKEN_KEY must be set to a Fernet key (Fernet.generate_key())")
+    await init_indexes()
     await init_quiz_questions()
+    await question_bank.load()
+    # Migrate legacy completed_levels arrays without blocking startup
+    asyncio.create_task(backfill_completed_masks())
+    asyncio.create_task(completion_rollup_loop())
+    asyncio.create_task(question_bank_refresh_loop())
     logger.info("Blurt Quest API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    key_deriver.shutdown()
+
+
+# Admin CLI
+async def read_file_lines(path: str) -> AsyncIterator[str]:
+    with open(path, encoding="utf-8") as pack:
+        for line in pack:
+            yield line
+
+async def run_cli(args: argparse.Namespace):
+    if args.command == "import-questions":
+        await question_bank.load()
+        summary = await import_question_pack(read_file_lines(args.path), prune=args.prune)
+        print(json.dumps(summary, indent=2))
+    elif args.command == "export-questions":
+        with open(args.path, "w", encoding="utf-8") as pack:
+            async for line in export_question_pack(args.level):
+                pack.write(line)
+    elif args.command == "reconcile-scores":
+        summary = await run_score_reconciliation(
+            dry_run=not args.apply,
+            resume=not args.restart,
+            chunk_size=args.chunk_size,
+            workers=args.workers
+        )
+        print(json.dumps(summary, indent=2, default=str))
+    elif args.command == "run-payouts":
+        broadcaster = get_payout_broadcaster()
+        if broadcaster is None:
+            raise SystemExit("Reward payouts are not configured")
+        summary = await run_reward_payouts(broadcaster, max_chunks=args.max_chunks)
+        print(json.dumps(summary, indent=2, default=str))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blurt Quest admin commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    import_parser = commands.add_parser("import-questions", help="Import a JSONL question pack")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--prune", action="store_true", help="Delete questions missing from the pack")
+    
+    export_parser = commands.add_parser("export-questions", help="Export questions as a JSONL pack")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--level", type=int)
+    
+    reconcile_parser = commands.add_parser("reconcile-scores", help="Recompute user scores from completion history")
+    reconcile_parser.add_argument("--apply", action="store_true", help="Write corrections (default is a dry run)")
+    reconcile_parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    reconcile_parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+    reconcile_parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS)
+    
+    payouts_parser = commands.add_parser("run-payouts", help="Pay out pending reward claims")
+    payouts_parser.add_argument("--max-chunks", type=int)
+    
+    asyncio.run(run_cli(parser.parse_args()))
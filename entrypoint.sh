@@ -4,6 +4,14 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
+# Attempt tokens are encrypted with this key; the backend refuses to start without it
+if [ -z "$ATTEMPT_TOKEN_KEY" ]; then
+    echo "ATTEMPT_TOKEN_KEY is not set. Generate one with:"
+    echo "  python3 -c 'from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())'"
+    echo "and pass it to the container, e.g. docker run -e ATTEMPT_TOKEN_KEY=..."
+    exit 1
+fi
+
 echo "Starting FastAPI backend"
 # Start Uvicorn with proper host binding
 uvicorn server:app --host 0.0.0.0 --port 8001 &
@@ -113,6 +113,7 @@ const GameDashboard = ({ username, onLogout }) => {
   const [currentLevel, setCurrentLevel] = useState(null);
   const [gameState, setGameState] = useState('dashboard'); // dashboard, playing, results
   const [questions, setQuestions] = useState([]);
+  const [attemptToken, setAttemptToken] = useState(null);
   const [answers, setAnswers] = useState([]);
   const [currentQuestion, setCurrentQuestion] = useState(0);
   const [timeRemaining, setTimeRemaining] = useState(60);
@@ -156,6 +157,7 @@ const GameDashboard = ({ username, onLogout }) => {
       });
       
       setQuestions(response.data.questions);
+      setAttemptToken(response.data.attempt_token);
       setCurrentLevel(level);
       setAnswers(new Array(response.data.questions.length).fill(-1));
       setCurrentQuestion(0);
@@ -185,8 +187,8 @@ const GameDashboard = ({ username, onLogout }) => {
     setLoading(true);
     try {
       const response = await axios.post(`${API}/game/level/${currentLevel}/submit`, {
-        answers: finalAnswers,
-        time_taken: (currentLevel * 30 + 60) - timeRemaining
+        attempt_token: attemptToken,
+        answers: finalAnswers
       }, {
         headers: getAuthHeaders()
       });
@@ -207,6 +209,7 @@ const GameDashboard = ({ username, onLogout }) => {
     setGameState('dashboard');
     setCurrentLevel(null);
     setQuestions([]);
+    setAttemptToken(null);
     setAnswers([]);
     setCurrentQuestion(0);
     setLevelResult(null);
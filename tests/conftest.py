@@ -0,0 +1,52 @@
+from pathlib import Path
+import sys
+
+# The backend runs from its own directory (uvicorn server:app), so import it the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cryptography.fernet import Fernet
+from datetime import datetime
+from mongomock_motor import AsyncMongoMockClient
+import asyncio
+import pytest
+
+import server
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = AsyncMongoMockClient()["blurt_quest_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+async def record_first_completions(username, bits, levels, points, current_level):
+    """Stand-in for the $bitsAllClear/$bit user update, which mongomock does not support"""
+    user = await server.db.users.find_one({"username": username})
+    if user is None or server.user_completed_mask(user) & bits:
+        return False
+    update = {"$set": {"last_active": datetime.utcnow()}}
+    if bits:
+        update["$set"]["completed_mask"] = server.user_completed_mask(user) | bits
+        update["$set"]["current_level"] = max(user["current_level"], current_level)
+        update["$inc"] = {"levels_completed": levels, "total_score": points}
+    await server.db.users.update_one({"_id": user["_id"]}, update)
+    return True
+
+
+@pytest.fixture
+def game(db, monkeypatch):
+    """Seeded questions, a player "alice" and a fresh attempt token key"""
+    key = Fernet.generate_key().decode()
+    monkeypatch.setattr(server, "ATTEMPT_TOKEN_KEY", key)
+    monkeypatch.setattr(server, "attempt_token_cipher", Fernet(key))
+    monkeypatch.setattr(server, "question_bank", server.QuestionBank())
+    monkeypatch.setattr(server, "record_first_completions", record_first_completions)
+
+    async def seed():
+        await server.init_quiz_questions()
+        await server.question_bank.load()
+        await db.users.insert_one(server.User(username="alice").dict())
+    asyncio.run(seed())
+    return db
+
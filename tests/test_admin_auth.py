@@ -0,0 +1,31 @@
+import asyncio
+import pytest
+
+import server
+
+
+def admin_guarded(path: str, method: str) -> bool:
+    route = next(r for r in server.app.routes if getattr(r, "path", None) == path and method in r.methods)
+    return any(dependency.call is server.require_admin for dependency in route.dependant.dependencies)
+
+
+def test_admin_routes_that_change_data_require_the_admin_token():
+    assert admin_guarded("/api/admin/questions/import", "POST")
+    assert admin_guarded("/api/admin/payouts/run", "POST")
+    assert admin_guarded("/api/admin/jobs/reconcile", "POST")
+
+
+def test_admin_api_is_disabled_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_TOKEN", None)
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.require_admin("anything"))
+    assert error.value.status_code == 403
+
+
+def test_wrong_or_missing_admin_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_TOKEN", "s3cret")
+    for token in [None, "", "wrong"]:
+        with pytest.raises(server.HTTPException) as error:
+            asyncio.run(server.require_admin(token))
+        assert error.value.status_code == 401
+    asyncio.run(server.require_admin("s3cret"))
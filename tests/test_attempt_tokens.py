@@ -0,0 +1,74 @@
+from cryptography.fernet import Fernet
+import asyncio
+import json
+import pytest
+import time
+
+import server
+
+
+def issue(level: int = 1) -> str:
+    return asyncio.run(server.issue_level_attempt(level, "alice"))["attempt_token"]
+
+
+def submit(token: str, answers=None, level: int = 1) -> dict:
+    if answers is None:
+        attempt = json.loads(server.attempt_token_cipher.decrypt(token.encode()))
+        answers = [server.question_bank.get(question_id)["correct_answer"] for question_id in attempt["q"]]
+    submission = server.LevelSubmission(attempt_token=token, answers=answers)
+    return asyncio.run(server.apply_level_submission(level, submission, "alice"))
+
+
+def rejected(token: str, level: int = 1, username: str = "alice") -> int:
+    with pytest.raises(server.HTTPException) as error:
+        server.read_attempt_token(token, username, level)
+    return error.value.status_code
+
+
+def test_token_hides_the_issued_questions_and_answers(game):
+    token = issue()
+    attempt = server.read_attempt_token(token, "alice", 1)
+    for question_id in attempt["q"]:
+        assert question_id not in token
+    assert len(attempt["q"]) == server.QUESTIONS_PER_ATTEMPT
+
+
+def test_tampered_or_foreign_tokens_are_rejected(game):
+    token = issue()
+    tampered = token[:40] + ("A" if token[40] != "A" else "B") + token[41:]
+    assert rejected(tampered) == 400
+    forged = Fernet(Fernet.generate_key()).encrypt(
+        server.attempt_token_cipher.decrypt(token.encode())
+    ).decode()
+    assert rejected(forged) == 400
+    assert rejected(token, username="bob") == 400
+    assert rejected(token, level=2) == 400
+
+
+def test_expired_token_is_rejected(game):
+    payload = server.attempt_token_cipher.decrypt(issue().encode())
+    issued_long_ago = time.time() - server.QUIZ_ATTEMPT_EXPIRE_MINUTES * 60 - 5
+    expired = server.attempt_token_cipher.encrypt_at_time(payload, int(issued_long_ago)).decode()
+    assert rejected(expired) == 400
+
+
+def test_token_can_only_be_submitted_once(game):
+    token = issue()
+    assert submit(token)["reward_earned"] == 1.0
+
+    with pytest.raises(server.HTTPException) as error:
+        submit(token)
+    assert error.value.status_code == 409
+    user = asyncio.run(game.users.find_one({"username": "alice"}))
+    assert user["total_score"] == 30
+    assert asyncio.run(game.reward_claims.count_documents({})) == 1
+
+
+def test_changed_answer_keys_invalidate_issued_tokens(game):
+    token = issue()
+    attempt = server.read_attempt_token(token, "alice", 1)
+    server.question_bank.answer_keys[attempt["q"][0]]["correct_answer"] += 1
+
+    with pytest.raises(server.HTTPException) as error:
+        submit(token, answers=[0] * len(attempt["q"]))
+    assert error.value.status_code == 409
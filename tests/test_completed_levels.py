@@ -0,0 +1,95 @@
+import asyncio
+
+import server
+
+
+def legacy_user(username: str, completed_levels: list) -> dict:
+    return {
+        "username": username,
+        "current_level": max(completed_levels, default=0) + 1,
+        "completed_levels": completed_levels,
+        "total_score": 10 * len(completed_levels)
+    }
+
+
+def test_mask_round_trips_levels():
+    levels = [1, 3, 4, 10]
+    mask = server.mask_from_levels(levels)
+    assert mask == 0b1000001101
+    assert server.levels_from_mask(mask) == levels
+    assert server.levels_from_mask(0) == []
+
+
+def test_legacy_user_is_read_through_the_array():
+    user = legacy_user("alice", [1, 2, 5])
+    assert server.user_completed_mask(user) == server.mask_from_levels([1, 2, 5])
+    assert server.user_levels_completed(user) == 3
+
+    migrated = {"completed_mask": server.mask_from_levels([2]), "levels_completed": 1}
+    assert server.user_completed_mask(migrated) == 0b10
+    assert server.user_levels_completed(migrated) == 1
+
+
+def test_legacy_user_is_migrated_on_first_use(db):
+    async def migrate():
+        await db.users.insert_one(legacy_user("alice", [1, 2]))
+        user = await server.migrate_user_completed_levels(await db.users.find_one({"username": "alice"}))
+        # Already migrated documents are returned unchanged
+        again = await server.migrate_user_completed_levels(user)
+        return user, again
+
+    user, again = asyncio.run(migrate())
+    assert user["completed_mask"] == 0b11
+    assert user["levels_completed"] == 2
+    assert "completed_levels" not in user
+    assert again == user
+
+
+def test_backfill_migrates_every_legacy_user_once(db):
+    async def backfill():
+        await db.users.insert_many(
+            [legacy_user(f"legacy{i}", list(range(1, i % 5 + 1))) for i in range(12)]
+            + [server.User(username="current", completed_mask=0b1, levels_completed=1).dict()]
+        )
+        first = await server.backfill_completed_masks(batch_size=5, pause_seconds=0)
+        # A completed backfill is not walked again on the next startup
+        await db.users.insert_one(legacy_user("late", [1]))
+        second = await server.backfill_completed_masks(batch_size=5, pause_seconds=0)
+        return first, second
+
+    first, second = asyncio.run(backfill())
+    assert first == 12
+    assert second == 0
+
+    users = asyncio.run(db.users.find({"username": {"$ne": "late"}}).to_list(None))
+    assert all("completed_levels" not in user for user in users)
+    for user in users:
+        if user["username"].startswith("legacy"):
+            i = int(user["username"][len("legacy"):])
+            assert server.levels_from_mask(user["completed_mask"]) == list(range(1, i % 5 + 1))
+            assert user["levels_completed"] == i % 5
+    state = asyncio.run(db.job_state.find_one({"_id": "completed_mask_backfill"}))
+    assert state["completed_at"] is not None
+    assert "lease_until" not in state
+
+
+def test_backfill_resumes_from_its_checkpoint(db):
+    async def resume():
+        await db.users.insert_many([legacy_user(f"legacy{i:02d}", [1]) for i in range(6)])
+        ids = [user["_id"] for user in await db.users.find().sort("_id", 1).to_list(None)]
+        # A previous run migrated the first three users and then stopped
+        await db.job_state.insert_one({"_id": "completed_mask_backfill", "last_id": ids[2]})
+        migrated = await server.backfill_completed_masks(batch_size=2, pause_seconds=0)
+        return ids, migrated
+
+    ids, migrated = asyncio.run(resume())
+    assert migrated == 3
+    untouched = asyncio.run(db.users.find({"_id": {"$in": ids[:3]}}).to_list(None))
+    assert all("completed_levels" in user for user in untouched)
+
+
+def test_profile_reads_legacy_users(db):
+    asyncio.run(db.users.insert_one(legacy_user("alice", [1, 2])))
+    profile = asyncio.run(server.get_user_profile("alice"))
+    assert profile["completed_levels"] == [1, 2]
+    assert profile["levels_completed"] == 2
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+import asyncio
+import pytest
+import time
+
+import server
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(server, "idempotency_cache", server.IdempotencyCache(100, 3600))
+
+
+@pytest.fixture
+def mongo_store(db, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_MONGO_STORE", True)
+    monkeypatch.setattr(server, "IDEMPOTENCY_WAIT_SECONDS", 1)
+    return db
+
+
+def counting_handler(response=None, error=None, delay=0):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise server.HTTPException(status_code=error, detail="failed")
+        return response
+    return handler, calls
+
+
+def test_duplicate_replays_the_first_response():
+    handler, calls = counting_handler({"score": 3})
+
+    async def twice():
+        first = await server.run_idempotent("k", "submit:alice:1", "f", handler)
+        second = await server.run_idempotent("k", "submit:alice:1", "f", handler)
+        return first, second
+
+    assert asyncio.run(twice()) == ({"score": 3}, {"score": 3})
+    assert len(calls) == 1
+
+
+def test_reused_key_with_a_different_request_is_rejected():
+    handler, _ = counting_handler({"score": 3})
+
+    async def reuse():
+        await server.run_idempotent("k", "submit:alice:1", "f", handler)
+        await server.run_idempotent("k", "submit:alice:1", "other", handler)
+
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(reuse())
+    assert error.value.status_code == 422
+
+
+def test_deterministic_client_errors_are_replayed():
+    handler, calls = counting_handler(error=400)
+
+    async def twice():
+        for _ in range(2):
+            with pytest.raises(server.HTTPException) as error:
+                await server.run_idempotent("k", "submit:alice:1", "f", handler)
+            assert error.value.status_code == 400
+    asyncio.run(twice())
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("status_code", [409, 429, 503])
+def test_retryable_errors_are_not_replayed(status_code):
+    handler, calls = counting_handler(error=status_code)
+
+    async def twice():
+        for _ in range(2):
+            with pytest.raises(server.HTTPException):
+                await server.run_idempotent("k", "sync:alice", "f", handler)
+    asyncio.run(twice())
+    assert len(calls) == 2
+
+
+def test_concurrent_duplicates_wait_for_the_original():
+    handler, calls = counting_handler({"ok": True}, delay=0.05)
+
+    async def concurrently():
+        return await asyncio.gather(*[
+            server.run_idempotent("k", "sync:alice", "f", handler) for _ in range(5)
+        ])
+
+    assert asyncio.run(concurrently()) == [{"ok": True}] * 5
+    assert len(calls) == 1
+
+
+def test_stored_outcome_is_replayed_by_another_worker(mongo_store):
+    handler, calls = counting_handler({"ok": True})
+
+    async def across_workers():
+        await server.run_idempotent("k", "sync:alice", "f", handler)
+        # A different worker has nothing in its memory cache
+        server.idempotency_cache.entries.clear()
+        return await server.run_idempotent("k", "sync:alice", "f", handler)
+
+    assert asyncio.run(across_workers()) == {"ok": True}
+    assert len(calls) == 1
+
+
+def test_login_outcomes_are_not_stored(mongo_store):
+    handler, _ = counting_handler({"access_token": "jwt"})
+    asyncio.run(server.run_idempotent("k", "login:alice", "f", handler, persist=False))
+    assert asyncio.run(mongo_store.idempotency_keys.count_documents({})) == 0
+
+
+def abandoned_key(fingerprint: str) -> dict:
+    return {
+        "_id": "sync:alice:k",
+        "status": "in_flight",
+        "fingerprint": fingerprint,
+        "owner": "crashed-worker",
+        "lease_until": datetime.utcnow() - timedelta(seconds=1),
+        "expires_at": datetime.utcnow() + timedelta(hours=1)
+    }
+
+
+def test_expired_in_flight_key_is_taken_over(mongo_store):
+    asyncio.run(mongo_store.idempotency_keys.insert_one(abandoned_key("f")))
+    handler, calls = counting_handler({"ok": True})
+
+    assert asyncio.run(server.run_idempotent("k", "sync:alice", "f", handler)) == {"ok": True}
+    assert len(calls) == 1
+    stored = asyncio.run(mongo_store.idempotency_keys.find_one({"_id": "sync:alice:k"}))
+    assert stored["status"] == "completed"
+    assert "owner" not in stored
+
+
+def test_expired_key_with_a_different_request_is_rejected_at_once(mongo_store):
+    asyncio.run(mongo_store.idempotency_keys.insert_one(abandoned_key("other")))
+    handler, calls = counting_handler({"ok": True})
+
+    started = time.monotonic()
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.run_idempotent("k", "sync:alice", "f", handler))
+    assert error.value.status_code == 422
+    assert time.monotonic() - started < 0.5
+    assert calls == []
+
+
+def test_worker_that_lost_its_key_does_not_overwrite_the_new_owner(mongo_store):
+    async def taken_over():
+        # Another worker took the key over while this handler was still running
+        await mongo_store.idempotency_keys.update_one(
+            {"_id": "sync:alice:k"}, {"$set": {"owner": "new-owner"}}
+        )
+        raise server.HTTPException(status_code=503, detail="failed")
+
+    with pytest.raises(server.HTTPException):
+        asyncio.run(server.run_idempotent("k", "sync:alice", "f", taken_over))
+    stored = asyncio.run(mongo_store.idempotency_keys.find_one({"_id": "sync:alice:k"}))
+    assert stored["owner"] == "new-owner"
+    assert stored["status"] == "in_flight"
+
+
+def test_in_flight_lease_is_renewed_while_the_handler_runs(mongo_store, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_LEASE_SECONDS", 0.15)
+
+    async def slow():
+        first = (await mongo_store.idempotency_keys.find_one({"_id": "sync:alice:k"}))["lease_until"]
+        await asyncio.sleep(0.3)
+        renewed = (await mongo_store.idempotency_keys.find_one({"_id": "sync:alice:k"}))["lease_until"]
+        return {"renewed": renewed > first}
+
+    assert asyncio.run(server.run_idempotent("k", "sync:alice", "f", slow)) == {"renewed": True}
@@ -0,0 +1,28 @@
+import asyncio
+
+import server
+
+
+def test_released_lease_can_be_taken_again_immediately(db):
+    async def cycle():
+        for _ in range(200):
+            assert await server.acquire_job_lease("completion_rollup", 60) is not None
+            await server.release_job_lease("completion_rollup")
+    asyncio.run(cycle())
+
+
+def test_held_lease_is_not_taken(db):
+    async def contend():
+        assert await server.acquire_job_lease("completion_rollup", 60) is not None
+        return await server.acquire_job_lease("completion_rollup", 60)
+    assert asyncio.run(contend()) is None
+
+
+def test_release_saves_checkpoint(db):
+    async def checkpoint():
+        await server.acquire_job_lease("score_reconcile", 60)
+        await server.release_job_lease("score_reconcile", {"last_id": "abc"})
+        return await db.job_state.find_one({"_id": "score_reconcile"})
+    state = asyncio.run(checkpoint())
+    assert state["last_id"] == "abc"
+    assert "lease_until" not in state
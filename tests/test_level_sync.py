@@ -0,0 +1,85 @@
+import asyncio
+import json
+import pytest
+
+import server
+
+
+def correct_answers(attempt_token: str) -> list:
+    attempt = json.loads(server.attempt_token_cipher.decrypt(attempt_token.encode()))
+    return [server.question_bank.get(question_id)["correct_answer"] for question_id in attempt["q"]]
+
+
+def sync_item(attempt: dict, answers=None) -> server.LevelSyncItem:
+    token = attempt["attempt_token"]
+    return server.LevelSyncItem(
+        level=attempt["level"],
+        attempt_token=token,
+        answers=correct_answers(token) if answers is None else answers,
+        time_taken=20
+    )
+
+
+def sync(items) -> dict:
+    return asyncio.run(server.apply_level_sync(server.LevelSyncRequest(results=items), "alice"))
+
+
+def test_offline_bundle_covers_upcoming_levels(game):
+    bundle = asyncio.run(server.get_offline_bundle(3, "alice"))
+    assert bundle["current_level"] == 1
+    assert [attempt["level"] for attempt in bundle["levels"]] == [1, 2, 3]
+    for attempt in bundle["levels"]:
+        assert attempt["questions"]
+        assert all("correct_answer" not in question for question in attempt["questions"])
+
+
+def test_levels_played_offline_unlock_in_order(game):
+    bundle = asyncio.run(server.get_offline_bundle(3, "alice"))
+
+    summary = sync([sync_item(attempt) for attempt in bundle["levels"]])
+
+    assert [result["accepted"] for result in summary["results"]] == [True, True, True]
+    assert summary["current_level"] == 4
+    assert summary["rewards_earned"] == 6.0
+    user = asyncio.run(game.users.find_one({"username": "alice"}))
+    assert server.levels_from_mask(user["completed_mask"]) == [1, 2, 3]
+    assert user["levels_completed"] == 3
+
+
+def test_level_not_unlocked_by_the_batch_is_rejected_and_its_token_released(game):
+    level_1, level_2 = asyncio.run(server.get_offline_bundle(2, "alice"))["levels"]
+    failed_level_1 = sync_item(level_1, answers=[-1] * len(correct_answers(level_1["attempt_token"])))
+
+    summary = sync([failed_level_1, sync_item(level_2)])
+
+    assert summary["results"][0]["accepted"] is True
+    assert summary["results"][0]["level_completed"] is False
+    assert summary["results"][1] == {"level": 2, "accepted": False, "detail": "Level not unlocked yet"}
+    assert summary["current_level"] == 1
+
+    # Once level 1 is passed, the rejected level 2 attempt can be synced again
+    retry = sync([sync_item(asyncio.run(server.get_offline_bundle(1, "alice"))["levels"][0]), sync_item(level_2)])
+    assert [result["accepted"] for result in retry["results"]] == [True, True]
+    assert retry["current_level"] == 3
+
+
+def test_reused_token_in_a_later_sync_is_rejected(game):
+    level_1, = asyncio.run(server.get_offline_bundle(1, "alice"))["levels"]
+    sync([sync_item(level_1)])
+
+    summary = sync([sync_item(level_1)])
+
+    assert summary["results"] == [{"level": 1, "accepted": False, "detail": "This attempt was already submitted"}]
+    assert summary["score_gained"] == 0
+
+
+def test_conflicting_progress_releases_every_token(game, monkeypatch):
+    level_1, = asyncio.run(server.get_offline_bundle(1, "alice"))["levels"]
+
+    async def concurrent_submit_won(*args):
+        return False
+    monkeypatch.setattr(server, "record_first_completions", concurrent_submit_won)
+    with pytest.raises(server.HTTPException) as error:
+        sync([sync_item(level_1)])
+    assert error.value.status_code == 409
+    assert asyncio.run(game.used_attempt_tokens.count_documents({})) == 0
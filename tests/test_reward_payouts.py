@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+import asyncio
+import pytest
+
+import server
+from external_integrations.blurt_payouts import FakeChainBroadcaster
+
+
+def add_claims(db, claims):
+    async def insert():
+        await db.reward_claims.insert_many([
+            server.RewardClaim(username=username, level=level, reward_amount=level * 1.0).dict()
+            for username, level in claims
+        ])
+    asyncio.run(insert())
+
+
+async def expire_leases(db):
+    """Simulate the payout and claim leases running out"""
+    past = datetime.utcnow() - timedelta(seconds=1)
+    await db.job_state.update_many({}, {"$set": {"lease_until": past}})
+    await db.reward_claims.update_many({"status": "processing"}, {"$set": {"lease_expires": past}})
+    await db.reward_payouts.update_many({"status": "sending"}, {"$set": {"owner_expires": past}})
+
+
+def test_claims_are_paid_once_per_user_and_marked_processed(db):
+    add_claims(db, [("alice", 1), ("alice", 2), ("bob", 1)])
+    chain = FakeChainBroadcaster()
+
+    summary = asyncio.run(server.run_reward_payouts(chain))
+
+    assert summary["payouts_sent"] == 2
+    assert summary["claims_processed"] == 3
+    assert summary["amount_sent"] == 4.0
+    assert sorted((b["to"], b["amount"]) for b in chain.broadcasts) == [("alice", 3.0), ("bob", 1.0)]
+    # Brand-new payouts never need a chain history lookup
+    assert chain.lookups == []
+
+    async def check():
+        claims = await db.reward_claims.find().to_list(None)
+        assert {c["status"] for c in claims} == {"processed"}
+        assert all("lease_id" not in c for c in claims)
+        payouts = await db.reward_payouts.find().to_list(None)
+        assert {p["status"] for p in payouts} == {"sent"}
+        for claim in claims:
+            payout = next(p for p in payouts if p["_id"] == claim["payout_id"])
+            assert claim["tx_id"] == payout["tx_id"]
+    asyncio.run(check())
+
+    # Nothing is left to pay
+    assert asyncio.run(server.run_reward_payouts(chain))["payouts_sent"] == 0
+    assert len(chain.broadcasts) == 2
+
+
+def test_failed_transfer_is_retried_with_the_same_payout(db):
+    add_claims(db, [("alice", 1), ("bob", 2)])
+    chain = FakeChainBroadcaster(fail_usernames=["bob"])
+
+    summary = asyncio.run(server.run_reward_payouts(chain))
+    assert summary["payouts_sent"] == 1
+    assert summary["payouts_failed"] == 1
+
+    async def bob_state():
+        claim = await db.reward_claims.find_one({"username": "bob"})
+        payout = await db.reward_payouts.find_one({"_id": claim["payout_id"]})
+        return claim, payout
+    claim, payout = asyncio.run(bob_state())
+    assert claim["status"] == "processing"
+    assert payout["status"] == "sending"
+
+    # Claims stay leased until the lease expires
+    assert asyncio.run(server.run_reward_payouts(chain))["payouts_failed"] == 0
+
+    chain.fail_usernames.clear()
+    asyncio.run(expire_leases(db))
+    summary = asyncio.run(server.run_reward_payouts(chain))
+    assert summary["payouts_sent"] == 1
+
+    retried_claim, retried_payout = asyncio.run(bob_state())
+    assert retried_claim["status"] == "processed"
+    assert retried_claim["payout_id"] == payout["_id"]
+    assert retried_payout["status"] == "sent"
+    # The abandoned "sending" payout was checked on chain before broadcasting again
+    assert chain.lookups == [payout["_id"]]
+    assert [b["to"] for b in chain.broadcasts] == ["alice", "bob"]
+
+
+def test_retry_after_crash_does_not_send_twice(db):
+    add_claims(db, [("alice", 3)])
+    chain = FakeChainBroadcaster()
+
+    async def crash_after_broadcast():
+        # A runner claimed the chunk, broadcast the transfer and died before recording it
+        lease_id = "crashed-lease"
+        claims = await server.claim_reward_chunk(lease_id, 10)
+        payout_id, = await server.assign_payouts(claims, lease_id)
+        await db.reward_payouts.update_one(
+            {"_id": payout_id},
+            {"$set": {"status": "sending", "owner": "crashed-runner"}}
+        )
+        await chain.transfer("alice", 3.0, payout_id)
+        await expire_leases(db)
+        return payout_id
+    payout_id = asyncio.run(crash_after_broadcast())
+
+    summary = asyncio.run(server.run_reward_payouts(chain))
+
+    assert summary["payouts_sent"] == 1
+    assert summary["claims_processed"] == 1
+    assert len(chain.broadcasts) == 1
+    payout = asyncio.run(db.reward_payouts.find_one({"_id": payout_id}))
+    assert payout["tx_id"] == chain.transfers[payout_id]["tx_id"]
+
+
+def test_payout_owned_by_a_live_runner_is_not_sent(db):
+    add_claims(db, [("alice", 1)])
+    chain = FakeChainBroadcaster()
+
+    async def claim_elsewhere():
+        claims = await server.claim_reward_chunk("other-lease", 10)
+        payout_id, = await server.assign_payouts(claims, "other-lease")
+        await db.reward_claims.update_many({}, {"$set": {"lease_expires": datetime.utcnow() - timedelta(seconds=1)}})
+        await db.reward_payouts.update_one(
+            {"_id": payout_id},
+            {"$set": {
+                "status": "sending",
+                "owner": "other-runner",
+                "owner_expires": datetime.utcnow() + timedelta(minutes=5)
+            }}
+        )
+    asyncio.run(claim_elsewhere())
+
+    summary = asyncio.run(server.run_reward_payouts(chain))
+
+    assert summary["payouts_sent"] == 0
+    assert chain.broadcasts == []
+    assert chain.lookups == []
+
+
+def test_back_to_back_runs_are_not_rejected(db):
+    chain = FakeChainBroadcaster()
+
+    async def run_twice():
+        await db.reward_claims.insert_one(server.RewardClaim(username="alice", level=1, reward_amount=1.0).dict())
+        first = await server.run_reward_payouts(chain)
+        await db.reward_claims.insert_one(server.RewardClaim(username="bob", level=2, reward_amount=2.0).dict())
+        second = await server.run_reward_payouts(chain)
+        return first, second
+
+    for _ in range(20):
+        first, second = asyncio.run(run_twice())
+        assert first["payouts_sent"] == 1
+        assert second["payouts_sent"] == 1
+        asyncio.run(db.reward_claims.delete_many({}))
+
+
+def test_concurrent_run_is_rejected(db):
+    async def hold_lease():
+        return await server.acquire_job_lease("reward_payouts", 300)
+    assert asyncio.run(hold_lease()) is not None
+
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.run_reward_payouts(FakeChainBroadcaster()))
+    assert error.value.status_code == 409